@@ -0,0 +1,90 @@
+import asyncio
+import os
+import time
+
+from database import get_connection, release_connection
+
+# страховка на випадок змін з інших реплік (сек); локальні зміни скидають знімок одразу
+ACTIVE_EVENTS_TTL = float(os.environ.get("ACTIVE_EVENTS_TTL", 30))
+
+
+class ActiveEvents:
+    """
+    Знімок активних івентів у пам'яті процесу.
+    Список змінюється лише при створенні / завершенні / скасуванні івенту —
+    ці хендлери викликають invalidate(). Кожне перечитування дає нову версію,
+    а відрендерене з нього (картки, клавіатури) кешується до наступної.
+    """
+
+    def __init__(self):
+        self.version = 0
+        # за часом проведення (starts_at)
+        self._events = ()
+        self._loaded_at = None
+        # росте при кожному invalidate(): знімок, що читався під час зміни, не вважаємо свіжим
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        # name -> (version, rendered)
+        self._rendered = {}
+
+    async def _load(self):
+        generation = self._generation
+        conn = await get_connection()
+        try:
+            rows = await conn.fetch(
+                """
+                SELECT event_id, title, starts_at,
+                       (starts_at AT TIME ZONE 'Europe/Kyiv')::date AS event_date,
+                       to_char(starts_at AT TIME ZONE 'Europe/Kyiv', 'HH24:MI') AS event_time,
+                       created_by, created_at
+                FROM events
+                WHERE status = 'active'
+                ORDER BY starts_at
+                """
+            )
+        finally:
+            await release_connection(conn)
+
+        self._events = tuple(dict(r) for r in rows)
+        self.version += 1
+        if generation == self._generation:
+            self._loaded_at = time.monotonic()
+
+    def _fresh(self):
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < ACTIVE_EVENTS_TTL
+
+    async def get(self):
+        """Активні івенти за часом проведення"""
+        if not self._fresh():
+            async with self._lock:
+                if not self._fresh():
+                    await self._load()
+        return self._events
+
+    async def latest(self):
+        """Останній створений активний івент або None"""
+        events = await self.get()
+        return max(events, key=lambda e: e["created_at"]) if events else None
+
+    async def render(self, name, render, by_date=False):
+        """
+        render(events) -> що завгодно; результат кешується до наступної версії знімка.
+        by_date — передати івенти в порядку проведення, інакше найновіші створені першими.
+        """
+        events = await self.get()
+        cached = self._rendered.get(name)
+        if cached and cached[0] == self.version:
+            return cached[1]
+        if not by_date:
+            events = sorted(events, key=lambda e: e["created_at"], reverse=True)
+        result = render(events)
+        self._rendered[name] = (self.version, result)
+        return result
+
+    def invalidate(self):
+        """Наступне звернення перечитає активні івенти з бази"""
+        self._generation += 1
+        self._loaded_at = None
+
+
+active_events = ActiveEvents()
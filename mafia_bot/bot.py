@@ -17,17 +17,55 @@ from aiogram.client.session.aiohttp import AiohttpSession
 from datetime import datetime, timedelta, time, date
 import asyncio
 from modules.underground.handlers import router as season_router
+from modules.underground.sheets import flush_loop as sheets_flush_loop, flush_writes as sheets_flush_writes
+from modules.underground.exporter import export_loop as season_export_loop
+from modules.underground import gateway as sheets_gateway
 # Імпортуємо функції з вашого нового database.py
-from database import get_connection, init_db
+from database import get_connection, release_connection, init_db, init_pool, close_pool, register_for_event
+from outbox import enqueue_broadcast, outbox_worker
+from scheduler import scheduler, kyiv_time, KYIV_TZ
+from fsm_storage import PostgresStorage
+from leader import jobs_leader, current_leader, NODE_ID
+from profiles import profiles, ProfileMiddleware
+from active_events import active_events
+from notify import (
+    changes, USERS_CHANGED, EVENTS_CHANGED, PLAYERS_CHANGED, SCHEDULED_JOBS_CHANGED, FSM_STATES_CHANGED
+)
+from modules.underground.leaderboard import leaderboard
 from datetime import datetime, timedelta, time
 import pytz
 from aiogram.filters import Command
 from aiogram.types import ReplyKeyboardRemove
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+import hashlib
+import signal
 
 # ================== INIT ==================
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
+storage = PostgresStorage()
+dp = Dispatcher(storage=storage)
+# роль і нік користувача — з кешу, хендлери отримують їх аргументом profile
+dp.message.middleware(ProfileMiddleware())
+dp.callback_query.middleware(ProfileMiddleware())
+
+# зміни з будь-якої репліки прибирають з локальних кешів саме змінені ключі;
+# після перепідключення слухача кеші скидаються повністю
+changes.on(USERS_CHANGED, lambda user_id: profiles.invalidate(int(user_id)), reset=profiles.clear)
+changes.on(EVENTS_CHANGED, lambda event_id: active_events.invalidate(), reset=active_events.invalidate)
+changes.on(PLAYERS_CHANGED, leaderboard.mark_changed, reset=leaderboard.invalidate)
+# jobs, створені на будь-якій репліці, — одразу в чергу лідера
+changes.on(SCHEDULED_JOBS_CHANGED, scheduler.job_changed, reset=scheduler.resync)
+# стан діалогу, змінений іншою реплікою
+changes.on(FSM_STATES_CHANGED, storage.remote_changed, reset=storage.clear)
+
+# Режим отримання апдейтів: "polling" (за замовчуванням) або "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Публічна адреса сервісу на Koyeb, напр. https://mafia-bot.koyeb.app
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Однаковий для всіх реплік; якщо не задано — виводимо з токена
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or hashlib.sha256((BOT_TOKEN or "").encode()).hexdigest()[:32]
 EVENT_LOCATION = "📍 *Театр МО*\nвул. ст. лейтенанта Кагала, 38\n(головний вхід)"
 # ================== STATES ==================
 class CreateEventStates(StatesGroup):
@@ -96,6 +134,22 @@ def invite_keyboard(event_id: int):
         ]
     )
 
+def events_keyboard(events, label_prefix, callback_prefix):
+    """Інлайн-вибір івенту: по кнопці на івент; None, якщо івентів немає"""
+    if not events:
+        return None
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(
+                    text=f"{label_prefix}{e['title']} ({e['event_date']})",
+                    callback_data=f"{callback_prefix}{e['event_id']}"
+                )
+            ]
+            for e in events
+        ]
+    )
+
 def payment_keyboard():
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -130,8 +184,9 @@ async def start_handler(message: types.Message, state: FSMContext):
     username = message.from_user.username
     conn = await get_connection()
     try:
+        # /start означає, що гравець знову приймає повідомлення від бота
         row = await conn.fetchrow(
-            "SELECT display_name, role FROM users WHERE user_id = $1",
+            "UPDATE users SET is_active = 1 WHERE user_id = $1 RETURNING display_name, role",
             user_id,
         )
         if not row:
@@ -142,6 +197,8 @@ async def start_handler(message: types.Message, state: FSMContext):
                 """,
                 user_id, username,
             )
+            # кешований «немає користувача» більше не правда
+            profiles.invalidate(user_id)
             await message.answer(
                 "👋 Вітаю!\n\nВведіть, будь ласка, ваш **нік** для ігор:",
                 parse_mode="Markdown",
@@ -162,7 +219,7 @@ async def start_handler(message: types.Message, state: FSMContext):
             reply_markup=keyboard,
         )
     finally:
-        await conn.close()
+        await release_connection(conn)
 
 @dp.message(NicknameState.waiting_for_nickname)
 async def save_nickname(message: types.Message, state: FSMContext):
@@ -178,6 +235,7 @@ async def save_nickname(message: types.Message, state: FSMContext):
             "UPDATE users SET display_name = $1 WHERE user_id = $2",
             nickname, user_id,
         )
+        profiles.invalidate(user_id)
         await state.clear()
         await message.answer(
             f"✅ Готово! Ваш нік: **{nickname}**",
@@ -185,52 +243,27 @@ async def save_nickname(message: types.Message, state: FSMContext):
             reply_markup=player_menu_keyboard(),
         )
     finally:
-        await conn.close()
+        await release_connection(conn)
 # ================== Colse Event ==================
 @dp.message(F.text == "🏁 Завершити вечір")
-async def choose_event_to_close(message: types.Message):
-    user_id = message.from_user.id
-    conn = await get_connection()
-    try:
-        role = await conn.fetchval(
-            "SELECT role FROM users WHERE user_id = $1",
-            user_id
-        )
-        if role != "admin":
-            return
-
-        events = await conn.fetch(
-            """
-            SELECT event_id, title, event_date
-            FROM events
-            WHERE status = 'active'
-            ORDER BY event_date
-            """
-        )
-
-        if not events:
-            await message.answer("ℹ️ Немає активних івентів.")
-            return
+async def choose_event_to_close(message: types.Message, profile):
+    if not profile or profile["role"] != "admin":
+        return
 
-        kb = InlineKeyboardMarkup(
-            inline_keyboard=[
-                [
-                    InlineKeyboardButton(
-                        text=f"🏁 {e['title']} ({e['event_date']})",
-                        callback_data=f"close_event_{e['event_id']}"
-                    )
-                ]
-                for e in events
-            ]
-        )
+    kb = await active_events.render(
+        "close_keyboard",
+        lambda events: events_keyboard(events, "🏁 ", "close_event_"),
+        by_date=True
+    )
 
-        await message.answer(
-            "🔒 Оберіть івент, який потрібно **завершити**:",
-            reply_markup=kb
-        )
+    if not kb:
+        await message.answer("ℹ️ Немає активних івентів.")
+        return
 
-    finally:
-        await conn.close()
+    await message.answer(
+        "🔒 Оберіть івент, який потрібно **завершити**:",
+        reply_markup=kb
+    )
 
 @dp.callback_query(F.data.startswith("close_event_"))
 async def close_event(callback: types.CallbackQuery):
@@ -238,17 +271,20 @@ async def close_event(callback: types.CallbackQuery):
     conn = await get_connection()
     try:
         event = await conn.fetchrow(
-            "SELECT title, event_date FROM events WHERE event_id = $1",
+            "SELECT title, (starts_at AT TIME ZONE 'Europe/Kyiv')::date AS event_date FROM events WHERE event_id = $1",
             event_id
         )
         if not event:
             await callback.answer("Івент не знайдено", show_alert=True)
             return
 
-        await conn.execute(
-            "UPDATE events SET status = 'closed' WHERE event_id = $1",
-            event_id
-        )
+        async with conn.transaction():
+            await conn.execute(
+                "UPDATE events SET status = 'closed' WHERE event_id = $1",
+                event_id
+            )
+            await scheduler.cancel(f"reminder:{event_id}", conn=conn)
+        active_events.invalidate()
 
         await callback.message.edit_text(
             f"✅ Івент завершено:\n\n"
@@ -260,54 +296,46 @@ async def close_event(callback: types.CallbackQuery):
         await callback.answer("Івент завершено")
 
     finally:
-        await conn.close()
+        await release_connection(conn)
 # ================== ACTIVE EVENTS ==================
-@dp.message(F.text == "📅 Активні події")
-async def show_active_events(message: types.Message):
-    conn = await get_connection()
-    try:
-        events = await conn.fetch(
-            """
-            SELECT event_id, title, event_date, event_time
-            FROM events
-            WHERE status = 'active'
-            ORDER BY created_at DESC
-            """
+def render_event_cards(events):
+    """[(текст картки, клавіатура запису)] для кожного активного івенту"""
+    return [
+        (
+            f"🎭 *{ev['title']}*\n"
+            f"📅 {ev['event_date'].strftime('%d.%m.%Y')}\n"
+            f"⏰ {ev['event_time']}\n\n"
+            f"{EVENT_LOCATION}",
+            invite_keyboard(ev["event_id"])
         )
+        for ev in events
+    ]
 
-        if not events:
-            await message.answer("ℹ️ Наразі немає активних івентів")
-            return
 
-        for ev in events:
-            event_date_str = ev["event_date"].strftime("%d.%m.%Y")
+@dp.message(F.text == "📅 Активні події")
+async def show_active_events(message: types.Message):
+    # картки й клавіатури рендеряться один раз на версію знімка
+    cards = await active_events.render("cards", render_event_cards)
 
-            await message.answer(
-                f"🎭 *{ev['title']}*\n"
-                f"📅 {event_date_str}\n"
-                f"⏰ {ev['event_time']}\n\n"
-                f"{EVENT_LOCATION}",
-                parse_mode="Markdown",
-                reply_markup=invite_keyboard(ev["event_id"])
-            )
+    if not cards:
+        await message.answer("ℹ️ Наразі немає активних івентів")
+        return
 
-    finally:
-        await conn.close()
+    for text, keyboard in cards:
+        await message.answer(
+            text,
+            parse_mode="Markdown",
+            reply_markup=keyboard
+        )
 # ================== CREATE EVENT (ADMIN) ==================
 
 @dp.message(F.text == "➕ Створити івент")
-async def create_event_start(message: types.Message, state: FSMContext):
-    user_id = message.from_user.id
-    conn = await get_connection()
-    try:
-        row = await conn.fetchrow("SELECT role FROM users WHERE user_id = $1", user_id)
-        if not row or row['role'] != "admin":
-            await message.answer("❌ У вас немає прав адміністратора")
-            return
-        await message.answer("📝 Введіть назву івенту (наприклад: Мафія Класика):")
-        await state.set_state(CreateEventStates.waiting_for_title)
-    finally:
-        await conn.close()
+async def create_event_start(message: types.Message, state: FSMContext, profile):
+    if not profile or profile["role"] != "admin":
+        await message.answer("❌ У вас немає прав адміністратора")
+        return
+    await message.answer("📝 Введіть назву івенту (наприклад: Мафія Класика):")
+    await state.set_state(CreateEventStates.waiting_for_title)
 
 @dp.message(CreateEventStates.waiting_for_title)
 async def create_event_title(message: types.Message, state: FSMContext):
@@ -317,20 +345,24 @@ async def create_event_title(message: types.Message, state: FSMContext):
 
 @dp.message(CreateEventStates.waiting_for_date)
 async def create_event_date(message: types.Message, state: FSMContext):
-    raw = message.text.strip()
-
-    try:
-        # очікуємо формат 07.02. або 07.02
-        event_date = datetime.strptime(raw.rstrip("."), "%d.%m").date()
-
-        # автоматично підставляємо поточний рік
-        event_date = event_date.replace(year=datetime.now().year)
-
-    except ValueError:
+    raw = message.text.strip().rstrip(".")
+    today = datetime.now(KYIV_TZ).date()
+
+    # очікуємо формат 07.02. або 07.02; рік — поточний,
+    # а якщо ця дата вже минула (напр. у грудні вводять 10.01) — наступний
+    for year in (today.year, today.year + 1):
+        try:
+            event_date = datetime.strptime(f"{raw}.{year}", "%d.%m.%Y").date()
+        except ValueError:
+            continue
+        if event_date >= today:
+            break
+    else:
         await message.answer("❌ Невірний формат дати. Введіть, будь ласка, так: 07.02")
         return
 
-    await state.update_data(event_date=event_date)
+    # FSM-дані зберігаються як JSON, тому дату кладемо рядком
+    await state.update_data(event_date=event_date.isoformat())
     await message.answer("⏰ Введіть час (наприклад: 19:00):")
     await state.set_state(CreateEventStates.waiting_for_time)
 
@@ -338,92 +370,96 @@ async def create_event_date(message: types.Message, state: FSMContext):
 async def create_event_time(message: types.Message, state: FSMContext):
     data = await state.get_data()
     title = data["title"]
-    event_date = data["event_date"]
-    event_time = message.text.strip()
+    event_date = date.fromisoformat(data["event_date"])
     admin_id = message.from_user.id
 
+    try:
+        # 19:00 або 19.00
+        start_time = datetime.strptime(message.text.strip().replace(".", ":"), "%H:%M").time()
+    except ValueError:
+        await message.answer("❌ Невірний формат часу. Введіть, будь ласка, так: 19:00")
+        return
+
+    starts_at = kyiv_time(event_date, start_time.hour, start_time.minute)
+    event_time = start_time.strftime("%H:%M")
+
+    event_date_str = event_date.strftime("%d.%m.%Y")
+    # про створення звітує вже розсилка (редагує це повідомлення) — після коміту
+    status = await message.answer("⏳ Створюю івент і розсилаю запрошення…")
+
     conn = await get_connection()
     try:
-        event_id = await conn.fetchval(
-            """
-            INSERT INTO events (title, event_date, event_time, status, created_by)
-            VALUES ($1, $2, $3, 'active', $4)
-            RETURNING event_id
-            """,
-            title, event_date, event_time, admin_id
-        )
+        # івент і розсилка — в одній транзакції, щоб запрошення не загубились
+        async with conn.transaction():
+            event_id = await conn.fetchval(
+                """
+                INSERT INTO events (title, starts_at, status, created_by)
+                VALUES ($1, $2, 'active', $3)
+                RETURNING event_id
+                """,
+                title, starts_at, admin_id
+            )
 
-        event_date_str = event_date.strftime("%d.%m.%Y")
+            players = await conn.fetch(
+                "SELECT user_id FROM users WHERE is_active = 1"
+            )
 
-        players = await conn.fetch(
-            "SELECT user_id FROM users WHERE is_active = 1"
-        )
+            await enqueue_broadcast(
+                [p["user_id"] for p in players],
+                f"🔔 *Новий івент!*\n\n"
+                f"🎭 *{title}*\n"
+                f"📅 {event_date_str}\n"
+                f"⏰ {event_time}",
+                parse_mode="Markdown",
+                reply_markup=invite_keyboard(event_id),
+                report_chat_id=status.chat.id,
+                report_message_id=status.message_id,
+                done_text="✅ Івент створено!\n📢 Запрошення розіслано гравцям: **{sent}**",
+                conn=conn
+            )
 
-        sent_count = 0
-        for p in players:
-            try:
-                await bot.send_message(
-                    p["user_id"],
-                    f"🔔 *Новий івент!*\n\n"
-                    f"🎭 *{title}*\n"
-                    f"📅 {event_date_str}\n"
-                    f"⏰ {event_time}",
-                    parse_mode="Markdown",
-                    reply_markup=invite_keyboard(event_id)
+            # нагадування о 12:00 напередодні (якщо цей момент ще не минув)
+            remind_at = kyiv_time(event_date - timedelta(days=1), 12)
+            if remind_at > datetime.now(pytz.utc):
+                await scheduler.schedule(
+                    f"reminder:{event_id}",
+                    "event_reminder",
+                    remind_at,
+                    {"event_id": event_id},
+                    conn=conn
                 )
-                sent_count += 1
-            except Exception:
-                continue
+    except Exception:
+        # транзакцію відкочено: івенту немає, стан лишаємо — можна ввести час ще раз
+        await status.edit_text("❌ Не вдалося створити івент. Введіть час ще раз")
+        raise
+    finally:
+        await release_connection(conn)
 
-        await state.clear()
-        await message.answer(
-            f"✅ Івент створено!\n📢 Запрошення розіслано гравцям: **{sent_count}**",
-            parse_mode="Markdown"
-        )
+    active_events.invalidate()
+    await state.clear()
 
-    finally:
-        await conn.close()
+    if not players:
+        await status.edit_text("✅ Івент створено!\nℹ️ Немає гравців для розсилки")
 #=================== COMMIT EVENT ====================
 @dp.message(F.text == "✅ Підтвердити вечір")
-async def confirm_event_start(message: types.Message):
-    user_id = message.from_user.id
-    conn = await get_connection()
-    try:
-        role = await conn.fetchval(
-            "SELECT role FROM users WHERE user_id = $1",
-            user_id
-        )
-        if role != "admin":
-            return
-
-        events = await conn.fetch("""
-            SELECT event_id, title, event_date
-            FROM events
-            WHERE status = 'active'
-            ORDER BY event_date
-        """)
-
-        if not events:
-            await message.answer("ℹ️ Немає активних івентів для підтвердження.")
-            return
+async def confirm_event_start(message: types.Message, profile):
+    if not profile or profile["role"] != "admin":
+        return
 
-        kb = InlineKeyboardMarkup(
-            inline_keyboard=[
-                [InlineKeyboardButton(
-                    text=f"🚀 {e['title']} ({e['event_date']})",
-                    callback_data=f"send_confirm_{e['event_id']}"
-                )]
-                for e in events
-            ]
-        )
+    kb = await active_events.render(
+        "confirm_keyboard",
+        lambda events: events_keyboard(events, "🚀 ", "send_confirm_"),
+        by_date=True
+    )
 
-        await message.answer(
-            "❓ Оберіть івент для надсилання підтвердження:",
-            reply_markup=kb
-        )
+    if not kb:
+        await message.answer("ℹ️ Немає активних івентів для підтвердження.")
+        return
 
-    finally:
-        await conn.close()
+    await message.answer(
+        "❓ Оберіть івент для надсилання підтвердження:",
+        reply_markup=kb
+    )
 
 @dp.callback_query(F.data.startswith("send_confirm_"))
 async def process_send_confirmation(callback: types.CallbackQuery):
@@ -434,26 +470,22 @@ async def process_send_confirmation(callback: types.CallbackQuery):
             "SELECT user_id FROM registrations WHERE event_id = $1 AND status = 'active'", 
             event_id
         )
-        if not players:
-            await callback.answer("На цей івент ще ніхто не записався", show_alert=True)
-            return
-        success_count = 0
-        for p in players:
-            try:
-                await bot.send_message(
-                    p['user_id'], 
-                    "✅ Ігровий вечір в силі! Чекаємо на тебе🫶"
-                )
-                success_count += 1
-            except Exception:
-                continue
-        await callback.message.edit_text(
-            f"✅ Підтвердження надіслано!\n👥 Гравців сповіщено: **{success_count}**",
-            parse_mode="Markdown"
-        )
-        await callback.answer("Розсилку завершено")
     finally:
-        await conn.close()
+        await release_connection(conn)
+
+    if not players:
+        await callback.answer("На цей івент ще ніхто не записався", show_alert=True)
+        return
+
+    await enqueue_broadcast(
+        [p['user_id'] for p in players],
+        "✅ Ігровий вечір в силі! Чекаємо на тебе🫶",
+        report_chat_id=callback.message.chat.id,
+        report_message_id=callback.message.message_id,
+        done_text="✅ Підтвердження надіслано!\n👥 Гравців сповіщено: **{sent}**"
+    )
+    await callback.message.edit_text("📤 Розсилаю підтвердження…")
+    await callback.answer("Розсилку розпочато")
 
 # ================== JOIN / COMMENT / CANCEL / LIST ==================
 
@@ -466,80 +498,48 @@ async def invite_join(
     user_id = callback.from_user.id
     event_id = callback_data.event_id
 
-    conn = await get_connection()
-    try:
-        # 1️⃣ Беремо івент
-        event = await conn.fetchrow(
-            """
-            SELECT event_id, title, status
-            FROM events
-            WHERE event_id = $1
-            """,
-            event_id
-        )
-
-        if not event:
-            await callback.answer("🚫 Івент не знайдено", show_alert=True)
-            return
+    # 1️⃣ Перевірка івенту, ніку і запис — одним запитом
+    reg = await register_for_event(event_id, user_id)
 
-        if event["status"] != "active":
-            status_text = "вже завершений" if event["status"] == "closed" else "скасований"
-            await callback.answer(f"🚫 Цей івент {status_text}.", show_alert=True)
-            return
-
-        # 2️⃣ Перевірка ніку
-        user = await conn.fetchrow(
-            "SELECT display_name FROM users WHERE user_id = $1",
-            user_id
-        )
-        if not user or not user["display_name"]:
-            await callback.answer(
-                "❌ Спочатку вкажіть ваш нік у /start",
-                show_alert=True
-            )
-            return
+    if not reg:
+        await callback.answer("🚫 Івент не знайдено", show_alert=True)
+        return
 
-        # 3️⃣ Перевірка — чи вже записаний
-        exists = await conn.fetchval(
-            """
-            SELECT 1
-            FROM registrations
-            WHERE event_id = $1
-              AND user_id = $2
-              AND status = 'active'
-            """,
-            event_id,
-            user_id
-        )
-        if exists:
-            await callback.answer("Ви вже записані на цей івент", show_alert=True)
-            return
+    if reg["status"] != "active":
+        status_text = "вже завершений" if reg["status"] == "closed" else "скасований"
+        await callback.answer(f"🚫 Цей івент {status_text}.", show_alert=True)
+        return
 
-        # 4️⃣ Запис
-        await conn.execute(
-            """
-            INSERT INTO registrations (event_id, user_id, status)
-            VALUES ($1, $2, 'active')
-            """,
-            event_id,
-            user_id
+    # 2️⃣ Перевірка ніку
+    if not reg["display_name"]:
+        await callback.answer(
+            "❌ Спочатку вкажіть ваш нік у /start",
+            show_alert=True
         )
+        return
 
-        await callback.message.edit_reply_markup(reply_markup=None)
-        await callback.answer("Ви записані!")
-
-        # 5️⃣ Переходимо до коментаря
-        await state.set_state(CommentState.waiting_for_comment)
-        await state.update_data(event_id=event_id)
+    # 3️⃣ Перевірка — чи вже записаний
+    if reg["registration_id"] is None:
+        await callback.answer("Ви вже записані на цей івент", show_alert=True)
+        return
 
-        await bot.send_message(
-            user_id,
-            f"🎭 *{event['title']}*\n\n💬 Напишіть коментар або `-` щоб пропустити",
-            parse_mode="Markdown"
-        )
+    await callback.message.edit_reply_markup(reply_markup=None)
+    await callback.answer("Ви записані!")
+
+    # 4️⃣ Переходимо до коментаря (дані для повідомлення адміну вже є)
+    await state.set_state(CommentState.waiting_for_comment)
+    await state.update_data(
+        event_id=event_id,
+        event_title=reg["title"],
+        event_created_by=reg["created_by"],
+        display_name=reg["display_name"]
+    )
 
-    finally:
-        await conn.close()
+    await bot.send_message(
+        user_id,
+        f"🎭 *{reg['title']}*\n\n💬 Напишіть коментар або `-` щоб пропустити",
+        parse_mode="Markdown"
+    )
 
 @dp.message(CommentState.waiting_for_comment)
 async def save_comment(message: types.Message, state: FSMContext):
@@ -564,52 +564,35 @@ async def save_comment(message: types.Message, state: FSMContext):
             event_id,
             user_id
         )
+    finally:
+        await release_connection(conn)
 
-        # 2️⃣ Дані івенту
-        event = await conn.fetchrow(
-            """
-            SELECT title, created_by
-            FROM events
-            WHERE event_id = $1
-            """,
-            event_id
-        )
-
-        # 3️⃣ Нік користувача
-        display_name = await conn.fetchval(
-            "SELECT display_name FROM users WHERE user_id = $1",
-            user_id
-        )
-
-        await state.clear()
+    await state.clear()
 
-        # 4️⃣ Повідомлення гравцю
-        await message.answer(
-            "✅ Запис підтверджено!",
-            reply_markup=cancel_keyboard(event_id)
-        )
-
-        # 5️⃣ Повідомлення адміну (безпечне)
-        if event and event["created_by"]:
-            try:
-                await bot.send_message(
-                    event["created_by"],
-                    (
-                        "🆕 *Нова реєстрація*\n"
-                        f"🎭 {event['title']}\n"
-                        f"👤 {display_name}\n"
-                        f"💬 {comment if comment else '—'}"
-                    ),
-                    parse_mode="Markdown"
-                )
-            except Exception as e:
-                print(f"⚠️ Не вдалося надіслати повідомлення адміну: {e}")
+    # 2️⃣ Повідомлення гравцю
+    await message.answer(
+        "✅ Запис підтверджено!",
+        reply_markup=cancel_keyboard(event_id)
+    )
 
-    finally:
-        await conn.close()
+    # 3️⃣ Повідомлення адміну (безпечне)
+    if data.get("event_created_by"):
+        try:
+            await bot.send_message(
+                data["event_created_by"],
+                (
+                    "🆕 *Нова реєстрація*\n"
+                    f"🎭 {data.get('event_title')}\n"
+                    f"👤 {data.get('display_name')}\n"
+                    f"💬 {comment if comment else '—'}"
+                ),
+                parse_mode="Markdown"
+            )
+        except Exception as e:
+            print(f"⚠️ Не вдалося надіслати повідомлення адміну: {e}")
 
 @dp.callback_query(InviteCallback.filter(F.action == "cancel"))
-async def invite_cancel(callback: types.CallbackQuery, callback_data: InviteCallback):
+async def invite_cancel(callback: types.CallbackQuery, callback_data: InviteCallback, profile):
     user_id = callback.from_user.id
     event_id = callback_data.event_id
     MY_ADMIN_ID = 444726017
@@ -661,11 +644,7 @@ async def invite_cancel(callback: types.CallbackQuery, callback_data: InviteCall
 
         # повідомлення адміну — ТІЛЬКИ якщо реально було що скасовувати
         if user_id != MY_ADMIN_ID:
-            user_nick = await conn.fetchval(
-                "SELECT display_name FROM users WHERE user_id = $1",
-                user_id
-            )
-            display_name = user_nick or callback.from_user.full_name
+            display_name = (profile and profile["display_name"]) or callback.from_user.full_name
 
             await bot.send_message(
                 MY_ADMIN_ID,
@@ -674,7 +653,7 @@ async def invite_cancel(callback: types.CallbackQuery, callback_data: InviteCall
             )
 
     finally:
-        await conn.close()
+        await release_connection(conn)
 
 @dp.callback_query(InviteCallback.filter(F.action == "list"))
 async def show_event_players(callback: types.CallbackQuery, callback_data: InviteCallback):
@@ -718,7 +697,7 @@ async def show_event_players(callback: types.CallbackQuery, callback_data: Invit
         await callback.answer()
 
     finally:
-        await conn.close()
+        await release_connection(conn)
 
 
 @dp.callback_query(InviteCallback.filter(F.action == "ignore"))
@@ -746,173 +725,179 @@ async def send_payment_info(message: types.Message):
     await message.answer(payment_text, parse_mode="Markdown", reply_markup=payment_keyboard())
 
 @dp.callback_query(F.data == "confirm_payment")
-async def process_payment_confirmation(callback: types.CallbackQuery):
+async def process_payment_confirmation(callback: types.CallbackQuery, profile):
     user_id = callback.from_user.id
     MY_ADMIN_ID = 444726017
-    conn = await get_connection()
-    user_nick = await conn.fetchval("SELECT display_name FROM users WHERE user_id = $1", user_id)
-    await conn.close()
-    name = user_nick or callback.from_user.full_name
+    name = (profile and profile["display_name"]) or callback.from_user.full_name
     await bot.send_message(MY_ADMIN_ID, f"💰 **Нове повідомлення про оплату!**\n👤 Гравець: {name}\n🆔 ID: `{user_id}`", parse_mode="Markdown")
     await callback.answer("✅ Повідомлення надіслано адміністратору!", show_alert=True)
     await callback.message.edit_reply_markup(reply_markup=None)
 
 # ================== ADMIN ACTIONS ==================
 
+# ліміт довжини одного повідомлення Telegram
+MESSAGE_LIMIT = 4096
+
+
+def pack_messages(blocks, limit=MESSAGE_LIMIT):
+    """
+    Склеює блоки тексту в якомога менше повідомлень до limit символів.
+    Задовгий блок ріжеться по рядках.
+    """
+    messages = []
+    current = ""
+    for block in blocks:
+        parts = [block]
+        if len(block) > limit:
+            parts, line_part = [], ""
+            for line in block.split("\n"):
+                while len(line) > limit:
+                    parts.append(line[:limit])
+                    line = line[limit:]
+                if line_part and len(line_part) + 1 + len(line) > limit:
+                    parts.append(line_part)
+                    line_part = line
+                else:
+                    line_part = f"{line_part}\n{line}" if line_part else line
+            if line_part:
+                parts.append(line_part)
+
+        for part in parts:
+            if current and len(current) + 2 + len(part) <= limit:
+                current += "\n\n" + part
+            else:
+                if current:
+                    messages.append(current)
+                current = part
+    if current:
+        messages.append(current)
+    return messages
+
+
 @dp.message(F.text == "🛠 Адмін: список + скасовані")
-async def show_players_admin(message: types.Message):
-    user_id = message.from_user.id
+async def show_players_admin(message: types.Message, profile):
+    # 1️⃣ Перевірка адміна
+    if not profile or profile["role"] != "admin":
+        return
+
     conn = await get_connection()
 
     try:
-        # 1️⃣ Перевірка адміна
-        role = await conn.fetchval(
-            "SELECT role FROM users WHERE user_id = $1",
-            user_id
-        )
-        if role != "admin":
-            return
-
-        # 2️⃣ Беремо ВСІ активні івенти
+        # 2️⃣ Усі активні івенти разом зі списками — одним запитом
         events = await conn.fetch(
             """
-            SELECT event_id, title, created_at
-            FROM events
-            WHERE status = 'active'
-            ORDER BY created_at
+            SELECT
+                e.title,
+                COALESCE(
+                    array_agg(
+                        u.display_name || COALESCE(' (' || NULLIF(r.comment, '') || ')', '')
+                        ORDER BY r.created_at
+                    ) FILTER (WHERE r.status = 'active'),
+                    '{}'
+                ) AS active,
+                COALESCE(
+                    array_agg(u.display_name ORDER BY r.created_at)
+                        FILTER (WHERE r.status = 'cancelled'),
+                    '{}'
+                ) AS cancelled
+            FROM events e
+            LEFT JOIN (registrations r JOIN users u ON u.user_id = r.user_id)
+                   ON r.event_id = e.event_id
+                  AND r.created_at >= e.created_at
+            WHERE e.status = 'active'
+            GROUP BY e.event_id
+            ORDER BY e.created_at
             """
         )
+    finally:
+        await release_connection(conn)
 
-        if not events:
-            await message.answer("ℹ️ Немає активних івентів")
-            return
+    if not events:
+        await message.answer("ℹ️ Немає активних івентів")
+        return
 
-        # 3️⃣ Для КОЖНОГО івенту формуємо окремий звіт
-        for event in events:
-            rows = await conn.fetch(
-                """
-                SELECT
-                    u.display_name,
-                    r.status,
-                    r.comment
-                FROM registrations r
-                JOIN users u ON u.user_id = r.user_id
-                WHERE r.event_id = $1
-                  AND r.created_at >= $2
-                ORDER BY r.created_at
-                """,
-                event["event_id"],
-                event["created_at"]
-            )
+    # 3️⃣ Звіт по кожному івенту — окремий блок
+    reports = []
+    for event in events:
+        active = event["active"]
+        cancelled = event["cancelled"]
 
-            active = []
-            cancelled = []
-
-            for r in rows:
-                if r["status"] == "active":
-                    name = r["display_name"]
-                    if r["comment"]:
-                        name += f" ({r['comment']})"
-                    active.append(name)
-                elif r["status"] == "cancelled":
-                    cancelled.append(r["display_name"])
-
-            # 4️⃣ Формуємо текст
-            text = f"🛠 *Адмін-звіт: {event['title']}*\n\n"
-
-            text += "✅ **Активні:**\n"
-            text += (
-                "\n".join(f"{i+1}. {p}" for i, p in enumerate(active))
-                if active else "—"
-            )
+        text = f"🛠 *Адмін-звіт: {event['title']}*\n\n"
 
-            text += "\n\n❌ **Скасували:**\n"
-            text += (
-                "\n".join(f"{i+1}. {p}" for i, p in enumerate(cancelled))
-                if cancelled else "—"
-            )
+        text += "✅ **Активні:**\n"
+        text += (
+            "\n".join(f"{i+1}. {p}" for i, p in enumerate(active))
+            if active else "—"
+        )
 
-            await message.answer(text)
+        text += "\n\n❌ **Скасували:**\n"
+        text += (
+            "\n".join(f"{i+1}. {p}" for i, p in enumerate(cancelled))
+            if cancelled else "—"
+        )
 
-    finally:
-        await conn.close()
+        reports.append(text)
+
+    # 4️⃣ Якомога менше повідомлень
+    for text in pack_messages(reports):
+        await message.answer(text)
 
 @dp.message(F.text == "❌ Скасувати івент")
-async def request_cancel_event(message: types.Message):
-    user_id = message.from_user.id
-    conn = await get_connection()
-    try:
-        row = await conn.fetchrow("SELECT role FROM users WHERE user_id = $1", user_id)
-        if not row or row['role'] != "admin": return
-        event = await conn.fetchrow("SELECT event_id, title, event_date, event_time FROM events WHERE status = 'active' LIMIT 1")
-        if not event:
-            await message.answer("ℹ️ Немає активних івентів для скасування.")
-            return
-        kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🔥 ПІДТВЕРДИТИ СКАСУВАННЯ", callback_data=f"confirm_cancel_{event['event_id']}") ]])
-        await message.answer(f"❓ Ви впевнені, що хочете скасувати івент:\n🎭 *{event['title']}* ({event['event_date']})?", parse_mode="Markdown", reply_markup=kb)
-    finally:
-        await conn.close()
+async def request_cancel_event(message: types.Message, profile):
+    if not profile or profile["role"] != "admin": return
+    event = await active_events.latest()
+    if not event:
+        await message.answer("ℹ️ Немає активних івентів для скасування.")
+        return
+    kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🔥 ПІДТВЕРДИТИ СКАСУВАННЯ", callback_data=f"confirm_cancel_{event['event_id']}") ]])
+    await message.answer(f"❓ Ви впевнені, що хочете скасувати івент:\n🎭 *{event['title']}* ({event['event_date']})?", parse_mode="Markdown", reply_markup=kb)
 
 @dp.callback_query(F.data.startswith("confirm_cancel_"))
-async def admin_confirm_cancel(callback: types.CallbackQuery):
+async def admin_confirm_cancel(callback: types.CallbackQuery, profile):
     event_id = int(callback.data.split("_")[2])
+    if not profile or profile["role"] != "admin":
+        await callback.answer("❌ Немає прав", show_alert=True)
+        return
     conn = await get_connection()
     try:
-        row = await conn.fetchrow("SELECT role FROM users WHERE user_id = $1", callback.from_user.id)
-        if not row or row['role'] != "admin":
-            await callback.answer("❌ Немає прав", show_alert=True)
-            return
-        players_to_notify = await conn.fetch("SELECT user_id FROM registrations WHERE event_id = $1 AND status = 'active'", event_id)
-        await conn.execute("UPDATE events SET status = 'closed' WHERE event_id = $1", event_id)
-        for p in players_to_notify:
-            try: await bot.send_message(p['user_id'], "😔 На жаль, ігровий вечір скасовано. Слідкуйте за новими анонсами!")
-            except: continue
-        await callback.message.edit_text(f"✅ Івент успішно скасовано.\n👥 Сповіщено гравців: **{len(players_to_notify)}**", parse_mode="Markdown")
-        await callback.answer("Івент скасовано")
+        async with conn.transaction():
+            players_to_notify = await conn.fetch("SELECT user_id FROM registrations WHERE event_id = $1 AND status = 'active'", event_id)
+            await conn.execute("UPDATE events SET status = 'closed' WHERE event_id = $1", event_id)
+            await scheduler.cancel(f"reminder:{event_id}", conn=conn)
+            await enqueue_broadcast(
+                [p['user_id'] for p in players_to_notify],
+                "😔 На жаль, ігровий вечір скасовано. Слідкуйте за новими анонсами!",
+                report_chat_id=callback.message.chat.id,
+                report_message_id=callback.message.message_id,
+                done_text="✅ Івент успішно скасовано.\n👥 Сповіщено гравців: **{sent}**",
+                conn=conn
+            )
     finally:
-        await conn.close()
+        await release_connection(conn)
+    active_events.invalidate()
+    if players_to_notify:
+        await callback.message.edit_text("📤 Івент скасовано, сповіщаю гравців…")
+    else:
+        await callback.message.edit_text("✅ Івент успішно скасовано.\n👥 Сповіщено гравців: **0**", parse_mode="Markdown")
+    await callback.answer("Івент скасовано")
 
 @dp.message(F.text == "📣 Повідомлення")
-async def broadcast_start(message: types.Message, state: FSMContext):
-    user_id = message.from_user.id
-
-    conn = await get_connection()
-    try:
-        role = await conn.fetchval(
-            "SELECT role FROM users WHERE user_id = $1",
-            user_id
-        )
-
-        if role != "admin":
-            return
-
-        events = await conn.fetch("""
-            SELECT event_id, title, event_date
-            FROM events
-            WHERE status = 'active'
-            ORDER BY event_date
-        """)
-
-        if not events:
-            await message.answer("❌ Немає активних івентів")
-            return
+async def broadcast_start(message: types.Message, state: FSMContext, profile):
+    if not profile or profile["role"] != "admin":
+        return
 
-        kb = InlineKeyboardMarkup(
-            inline_keyboard=[
-                [
-                    InlineKeyboardButton(
-                        text=f"{e['title']} ({e['event_date']})",
-                        callback_data=f"broadcast_event_{e['event_id']}"
-                    )
-                ] for e in events
-            ]
-        )
+    kb = await active_events.render(
+        "broadcast_keyboard",
+        lambda events: events_keyboard(events, "", "broadcast_event_"),
+        by_date=True
+    )
 
-        await message.answer("🎯 Оберіть івент:", reply_markup=kb)
-        await state.set_state(BroadcastStates.choosing_event)
+    if not kb:
+        await message.answer("❌ Немає активних івентів")
+        return
 
-    finally:
-        await conn.close()
+    await message.answer("🎯 Оберіть івент:", reply_markup=kb)
+    await state.set_state(BroadcastStates.choosing_event)
 
 @dp.callback_query(F.data.startswith("broadcast_event_"))
 async def broadcast_choose_event(callback: types.CallbackQuery, state: FSMContext):
@@ -949,115 +934,116 @@ async def broadcast_send(message: types.Message, state: FSMContext):
               AND status = 'active'
         """, event_id)
 
-        if not users:
-            await message.answer("❌ Немає зареєстрованих гравців")
-            return
+    finally:
+        await release_connection(conn)
 
-        sent = 0
+    if not users:
+        await message.answer("❌ Немає зареєстрованих гравців")
+        return
 
-        for u in users:
-            try:
-                await bot.send_message(
-                    u["user_id"],
-                    f"📣 *Оновлення по івенту*\n\n"
-                    f"🎭 {event['title']}\n\n"
-                    f"{text}",
-                    parse_mode="Markdown"
-                )
-                sent += 1
-            except:
-                continue
+    await state.clear()
+
+    status = await message.answer("📤 Розсилаю повідомлення…")
+    await enqueue_broadcast(
+        [u["user_id"] for u in users],
+        f"📣 *Оновлення по івенту*\n\n"
+        f"🎭 {event['title']}\n\n"
+        f"{text}",
+        parse_mode="Markdown",
+        report_chat_id=status.chat.id,
+        report_message_id=status.message_id,
+        done_text="✅ Повідомлення відправлено!\n👥 Отримали: **{sent}**"
+    )
+# ================== REMINDER ==================
+@scheduler.handler("event_reminder")
+async def send_event_reminder(payload):
+    """Нагадування гравцям, які ще не записались (о 12:00 напередодні івенту)"""
+    event_id = payload["event_id"]
+    # івент має бути не раніше завтрашнього дня (за Києвом)
+    tomorrow = kyiv_time(datetime.now(KYIV_TZ).date() + timedelta(days=1), 0)
 
-        await message.answer(
-            f"✅ Повідомлення відправлено!\n👥 Отримали: **{sent}**",
-            parse_mode="Markdown"
+    conn = await get_connection()
+    try:
+        event = await conn.fetchrow(
+            """
+            SELECT event_id, title
+            FROM events
+            WHERE event_id = $1
+              AND status = 'active'
+              AND reminder_sent = false
+              AND starts_at >= $2
+            """,
+            event_id,
+            tomorrow
         )
 
-        await state.clear()
-
-    finally:
-        await conn.close()
-# ================== REMINDER ==================
-async def reminder_loop():
-    tz = pytz.timezone("Europe/Kyiv")
+        # івент скасовано / вже нагадали / після рестарту нагадування вже неактуальне
+        if not event:
+            return
 
-    while True:
-        now = datetime.now(tz)
-        print("🕒 reminder loop alive:", now.strftime("%Y-%m-%d %H:%M:%S"))
+        title = event["title"]
+        print(f"➡️ processing reminder {event_id} | {title}")
 
-        # рівно о 12:00 за Києвом
-        if now.hour == 12:
-            conn = await get_connection()
-            try:
-                events = await conn.fetch(
-                    """
-                    SELECT event_id, title, event_date
-                    FROM events
-                    WHERE status = 'active'
-                      AND reminder_sent = false
-                      AND event_date = (CURRENT_DATE + INTERVAL '1 day')::date
-                    """
-                )
+        users = await conn.fetch(
+            """
+            SELECT u.user_id
+            FROM users u
+            WHERE u.is_active = 1
+              AND NOT EXISTS (
+                  SELECT 1
+                  FROM registrations r
+                  WHERE r.user_id = u.user_id
+                    AND r.event_id = $1
+                    AND r.status = 'active'
+              )
+            """,
+            event_id
+        )
 
-                print(f"📦 events found: {len(events)}")
-
-                for event in events:
-                    event_id = event["event_id"]
-                    title = event["title"]
-
-                    print(f"➡️ processing event {event_id} | {title}")
-
-                    users = await conn.fetch(
-                        """
-                        SELECT u.user_id
-                        FROM users u
-                        WHERE u.is_active = 1
-                          AND NOT EXISTS (
-                              SELECT 1
-                              FROM registrations r
-                              WHERE r.user_id = u.user_id
-                                AND r.event_id = $1
-                                AND r.status = 'active'
-                          )
-                        """,
-                        event_id
-                    )
-
-                    sent = 0
-                    for u in users:
-                        try:
-                            await bot.send_message(
-                                u["user_id"],
-                                f"⏰ *Нагадування!*\n\n"
-                                f"Завтра відбудеться івент:\n"
-                                f"🎭 *{title}*\n\n"
-                                f"{EVENT_LOCATION}\n\n"
-                                f"Ще є час записатись 👇",
-                                parse_mode="Markdown",
-                                reply_markup=invite_keyboard(event_id)
-                            )
-                            sent += 1
-                        except Exception:
-                            continue
-
-                    await conn.execute(
-                        "UPDATE events SET reminder_sent = true WHERE event_id = $1",
-                        event_id
-                    )
-
-                    ADMIN_ID = 444726017
-                    await bot.send_message(
-                        ADMIN_ID,
-                        f"📣 *Нагадування надіслано*\n"
-                        f"🎭 {title}\n"
-                        f"👥 Отримали: **{sent}**",
-                        parse_mode="Markdown"
-                    )
+        ADMIN_ID = 444726017
+        done_text = (
+            f"📣 *Нагадування надіслано*\n"
+            f"🎭 {title}\n"
+            "👥 Отримали: **{sent}**"
+        )
 
-            finally:
-                await conn.close()
+        # розсилка і позначка reminder_sent — атомарно;
+        # UPDATE ... RETURNING гарантує, що нагадування піде лише один раз,
+        # навіть якщо на мить два вузли вважали себе лідером
+        async with conn.transaction():
+            claimed = await conn.fetchval(
+                """
+                UPDATE events SET reminder_sent = true
+                WHERE event_id = $1 AND reminder_sent = false
+                RETURNING event_id
+                """,
+                event_id
+            )
+            if not claimed:
+                return
+
+            await enqueue_broadcast(
+                [u["user_id"] for u in users],
+                f"⏰ *Нагадування!*\n\n"
+                f"Завтра відбудеться івент:\n"
+                f"🎭 *{title}*\n\n"
+                f"{EVENT_LOCATION}\n\n"
+                f"Ще є час записатись 👇",
+                parse_mode="Markdown",
+                reply_markup=invite_keyboard(event_id),
+                report_chat_id=ADMIN_ID,
+                done_text=done_text,
+                conn=conn
+            )
+    finally:
+        await release_connection(conn)
 
-        await asyncio.sleep(60)
+    if not users:
+        await bot.send_message(
+            ADMIN_ID,
+            done_text.replace("{sent}", "0"),
+            parse_mode="Markdown"
+        )
 # ================== UNDERGROUND =======================
 dp.include_router(season_router)
 # ================== RUNNER & WEB SERVER ==================
@@ -1065,17 +1051,78 @@ dp.include_router(season_router)
 async def handle(request):
     return web.Response(text="Bot is running!")
 
+async def handle_leader(request):
+    """Яка репліка зараз виконує singleton-задачі"""
+    lease = await current_leader(jobs_leader.name)
+    return web.json_response({
+        "node_id": NODE_ID,
+        "is_leader": jobs_leader.is_leader,
+        "leader": lease["node_id"] if lease else None,
+        "renewed_at": lease["renewed_at"].isoformat() if lease else None,
+    })
+
 async def start_all():
-    await init_db()
-    app = web.Application()
-    app.router.add_get('/', handle)
-    runner = web.AppRunner(app)
-    await runner.setup()
-    site = web.TCPSite(runner, '0.0.0.0', int(os.environ.get("PORT", 8000)))
-    await site.start()
-    print("Starting bot...")
-    asyncio.create_task(reminder_loop())
-    await dp.start_polling(bot)
+    use_webhook = BOT_MODE == "webhook"
+    if use_webhook and not WEBHOOK_URL:
+        print("⚠️ BOT_MODE=webhook, але WEBHOOK_URL не задано — працюємо через polling")
+        use_webhook = False
+
+    await init_pool()
+    try:
+        await init_db()
+        app = web.Application()
+        app.router.add_get('/', handle)
+        app.router.add_get('/leader', handle_leader)
+
+        if use_webhook:
+            # апдейти приходять на той самий aiohttp-сервер, що й health check
+            SimpleRequestHandler(
+                dispatcher=dp,
+                bot=bot,
+                secret_token=WEBHOOK_SECRET,
+            ).register(app, path=WEBHOOK_PATH)
+            setup_application(app, dp, bot=bot)
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '0.0.0.0', int(os.environ.get("PORT", 8000)))
+        await site.start()
+        print("Starting bot...")
+        # нагадування, експорт сезону в таблицю та інші singleton-задачі — лише на репліці-лідері
+        asyncio.create_task(jobs_leader.run(scheduler.run, season_export_loop))
+        asyncio.create_task(outbox_worker(bot))
+        asyncio.create_task(sheets_flush_loop())
+        asyncio.create_task(changes.run())
+
+        if use_webhook:
+            await bot.set_webhook(
+                WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            print(f"🌐 webhook mode: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+
+            # Koyeb зупиняє інстанс через SIGTERM — виходимо штатно, щоб спрацював finally
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(sig, stop.set)
+            try:
+                await stop.wait()
+            finally:
+                await runner.cleanup()
+        else:
+            # інакше getUpdates не працюватиме, якщо раніше був webhook
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        # жодне нарахування не має загубитись у черзі записів у таблицю
+        try:
+            await sheets_gateway.run_sheets(sheets_flush_writes)
+        except Exception as e:
+            print(f"⚠️ sheets flush on shutdown failed: {e}")
+        sheets_gateway.shutdown()
+        await close_pool()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,168 @@
+import asyncio
+import os
+import time
+
+from aiogram.exceptions import (
+    TelegramRetryAfter,
+    TelegramNetworkError,
+    TelegramServerError,
+    TelegramBadRequest,
+    TelegramForbiddenError,
+)
+
+# ================== LIMITS ==================
+# Telegram дозволяє ~30 повідомлень/сек на бота і ~1 повідомлення/сек в один чат
+BROADCAST_RATE = float(os.environ.get("BROADCAST_RATE", 25))
+BROADCAST_CONCURRENCY = int(os.environ.get("BROADCAST_CONCURRENCY", 10))
+PER_CHAT_INTERVAL = 1.0
+# скільки разів повторювати при мережевих / 5xx помилках
+BROADCAST_RETRIES = 3
+# як часто оновлювати прогрес у адміна (сек)
+PROGRESS_INTERVAL = 3.0
+
+# помилки BadRequest, після яких у цей чат писати вже немає сенсу
+UNREACHABLE_ERRORS = (
+    "chat not found",
+    "user is deactivated",
+    "bot was blocked",
+    "peer_id_invalid",
+    "bot can't initiate conversation",
+)
+
+
+class TokenBucket:
+    """Глобальний ліміт повідомлень на секунду для всього процесу"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        """Після RetryAfter зупиняємо всі відправки, а не лише одну"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+_bucket = TokenBucket(BROADCAST_RATE)
+_last_sent_to_chat = {}
+
+
+async def _wait_for_chat(chat_id):
+    last = _last_sent_to_chat.get(chat_id)
+    if last is not None:
+        delay = last + PER_CHAT_INTERVAL - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    _last_sent_to_chat[chat_id] = time.monotonic()
+
+    # не даємо словнику рости безкінечно
+    if len(_last_sent_to_chat) > 10_000:
+        border = time.monotonic() - PER_CHAT_INTERVAL
+        for key in [k for k, v in _last_sent_to_chat.items() if v < border]:
+            del _last_sent_to_chat[key]
+
+
+class BroadcastResult:
+    def __init__(self, total):
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        # chat_id -> текст помилки для тих, кому не доставлено
+        self.errors = {}
+        # чати, які заблокували бота / видалені — їх треба вимкнути з розсилок
+        self.unreachable = set()
+
+    @property
+    def done(self):
+        return self.sent + self.failed
+
+
+class Unreachable(Exception):
+    """Чат недоступний назавжди (бот заблокований, акаунт видалено)"""
+
+
+def _is_unreachable(error):
+    if isinstance(error, TelegramForbiddenError):
+        return True
+    if isinstance(error, TelegramBadRequest):
+        text = str(error).lower()
+        return any(marker in text for marker in UNREACHABLE_ERRORS)
+    return False
+
+
+async def _deliver(bot, chat_id, text, **kwargs):
+    """
+    Повертає None, якщо доставлено, інакше текст помилки.
+    Якщо чат недоступний назавжди — кидає Unreachable.
+    """
+    error = None
+    for attempt in range(BROADCAST_RETRIES + 1):
+        await _bucket.acquire()
+        await _wait_for_chat(chat_id)
+        try:
+            await bot.send_message(chat_id, text, **kwargs)
+            return None
+        except TelegramRetryAfter as e:
+            _bucket.pause(e.retry_after)
+            error = str(e)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            error = str(e)
+            if attempt < BROADCAST_RETRIES:
+                await asyncio.sleep(2 ** attempt)
+        except Exception as e:
+            if _is_unreachable(e):
+                raise Unreachable(str(e))
+            error = str(e)
+            break
+
+    print(f"⚠️ broadcast to {chat_id} failed: {error}")
+    return error
+
+
+async def broadcast(bot, chat_ids, text, **kwargs):
+    """
+    Розсилає text усім chat_ids паралельно (з обмеженням concurrency і rate limit).
+    Прогрес адміну показує outbox._report_progress.
+    """
+    chat_ids = list(chat_ids)
+    result = BroadcastResult(len(chat_ids))
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+
+    async def worker(chat_id):
+        async with semaphore:
+            try:
+                error = await _deliver(bot, chat_id, text, **kwargs)
+            except Unreachable as e:
+                error = str(e)
+                result.unreachable.add(chat_id)
+            if error is None:
+                result.sent += 1
+            else:
+                result.failed += 1
+                result.errors[chat_id] = error
+
+    await asyncio.gather(*(worker(chat_id) for chat_id in chat_ids))
+    return result
+
+
+def progress_text(done, total, sent, failed):
+    return f"📤 Розсилка… {done}/{total}\n✅ {sent}  ❌ {failed}"
+
@@ -6,9 +6,46 @@ from datetime import datetime
 # Отримуємо URL з Environment Variables на Koyeb
 DATABASE_URL = os.environ.get("DATABASE_URL")
 
+# SQL-міграції, застосовуються по порядку номерів у назві файлу
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+# Параметри пулу з'єднань (можна перевизначити через Environment Variables)
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 10))
+# через скільки секунд простою з'єднання закривається (Neon сам рве idle-конекти)
+DB_POOL_MAX_IDLE = float(os.environ.get("DB_POOL_MAX_IDLE", 300))
+# скільки чекати на вільне з'єднання з пулу
+DB_ACQUIRE_TIMEOUT = float(os.environ.get("DB_ACQUIRE_TIMEOUT", 10))
+
+_pool = None
+
+async def init_pool():
+    """Створює спільний пул з'єднань до Neon (PostgreSQL) на весь процес"""
+    global _pool
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            DATABASE_URL,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            max_inactive_connection_lifetime=DB_POOL_MAX_IDLE,
+        )
+    return _pool
+
+async def close_pool():
+    """Закриває пул при зупинці бота"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
 async def get_connection():
-    """Створює підключення до бази даних Neon (PostgreSQL)"""
-    return await asyncpg.connect(DATABASE_URL)
+    """Бере з'єднання з пулу. Обов'язково повертати через release_connection()"""
+    pool = await init_pool()
+    return await pool.acquire(timeout=DB_ACQUIRE_TIMEOUT)
+
+async def release_connection(conn):
+    """Повертає з'єднання назад у пул"""
+    await _pool.release(conn)
 
 async def cancel_event_in_db(event_id):
     conn = await get_connection()
@@ -20,7 +57,49 @@ async def cancel_event_in_db(event_id):
         rows = await conn.fetch("SELECT user_id FROM registrations WHERE event_id = $1 AND status = 'active'", event_id)
         return [r['user_id'] for r in rows]
     finally:
-        await conn.close()
+        await release_connection(conn)
+
+async def register_for_event(event_id, user_id):
+    """
+    Записує гравця на івент одним запитом.
+    Повертає None, якщо івенту немає, інакше рядок з полями
+    title, status, created_by, display_name і registration_id
+    (registration_id = NULL, якщо запис не створено: івент не активний,
+    немає ніку або гравець уже записаний).
+    """
+    conn = await get_connection()
+    try:
+        return await conn.fetchrow(
+            """
+            WITH ev AS (
+                SELECT event_id, title, status, created_by
+                FROM events
+                WHERE event_id = $1
+            ),
+            usr AS (
+                SELECT display_name
+                FROM users
+                WHERE user_id = $2
+            ),
+            ins AS (
+                INSERT INTO registrations (event_id, user_id, status)
+                SELECT ev.event_id, $2, 'active'
+                FROM ev, usr
+                WHERE ev.status = 'active'
+                  AND usr.display_name IS NOT NULL
+                ON CONFLICT (event_id, user_id) WHERE status = 'active' DO NOTHING
+                RETURNING registration_id
+            )
+            SELECT ev.title, ev.status, ev.created_by, usr.display_name,
+                   (SELECT registration_id FROM ins) AS registration_id
+            FROM ev
+            LEFT JOIN usr ON true
+            """,
+            event_id,
+            user_id
+        )
+    finally:
+        await release_connection(conn)
 
 async def get_total_players_count():
     conn = await get_connection()
@@ -29,56 +108,78 @@ async def get_total_players_count():
         count = await conn.fetchval("SELECT COUNT(*) FROM users")
         return count if count else 0
     finally:
-        await conn.close()
+        await release_connection(conn)
+
+# ================== MIGRATIONS ==================
+# Ключ advisory lock, щоб кілька реплік не накатували міграції одночасно
+MIGRATION_LOCK_KEY = 7_305_001
+
+def _load_migrations():
+    """Повертає [(version, name, sql)] з папки migrations, відсортовані за версією"""
+    migrations = []
+    for name in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not name.endswith(".sql"):
+            continue
+        version = int(name.split("_", 1)[0])
+        with open(os.path.join(MIGRATIONS_DIR, name), encoding="utf-8") as f:
+            migrations.append((version, name, f.read()))
+    return migrations
+
+async def _current_schema_version(conn):
+    try:
+        return await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    except asyncpg.UndefinedTableError:
+        return 0
 
 async def init_db():
-    """Створює таблиці, якщо вони не існують"""
+    """Накатує нові міграції. Якщо схема актуальна — це один запит"""
+    migrations = _load_migrations()
+    latest = migrations[-1][0] if migrations else 0
+
     conn = await get_connection()
-    
-    # Таблиця користувачів
-    await conn.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        user_id BIGINT PRIMARY KEY,
-        username TEXT,
-        display_name TEXT,
-        role TEXT NOT NULL CHECK(role IN ('admin','player')),
-        is_active INTEGER NOT NULL DEFAULT 1,
-        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-
-    # Таблиця подій (ігор)
-    await conn.execute("""
-    CREATE TABLE IF NOT EXISTS events (
-        event_id SERIAL PRIMARY KEY,
-        title TEXT NOT NULL,
-        event_date TEXT NOT NULL,
-        event_time TEXT NOT NULL,
-        status TEXT NOT NULL CHECK(status IN ('active','closed')),
-        created_by BIGINT NOT NULL,
-        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-
-    # Таблиця реєстрацій
-    await conn.execute("""
-    CREATE TABLE IF NOT EXISTS registrations (
-        registration_id SERIAL PRIMARY KEY,
-        event_id INTEGER NOT NULL REFERENCES events(event_id) ON DELETE CASCADE,
-        user_id BIGINT NOT NULL REFERENCES users(user_id),
-        comment TEXT,
-        status TEXT NOT NULL CHECK(status IN ('active','cancelled')),
-        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-
-    await conn.close()
+    try:
+        # швидкий шлях: схема вже актуальна
+        if await _current_schema_version(conn) >= latest:
+            return
+
+        await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_KEY)
+        try:
+            await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+            """)
+
+            # інша репліка могла накотити міграції, поки ми чекали на lock
+            current = await _current_schema_version(conn)
+
+            for version, name, sql in migrations:
+                if version <= current:
+                    continue
+                async with conn.transaction():
+                    await conn.execute(sql)
+                    await conn.execute(
+                        "INSERT INTO schema_version (version, name) VALUES ($1, $2)",
+                        version, name
+                    )
+                print(f"🗄 migration applied: {name}")
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_KEY)
+    finally:
+        await release_connection(conn)
     print("Database initialized successfully!")
 
+async def _init_db_standalone():
+    try:
+        await init_db()
+    finally:
+        await close_pool()
+
 # Якщо потрібно запустити створення таблиць вручну
 if __name__ == "__main__":
-    asyncio.run(init_db())
+    asyncio.run(_init_db_standalone())
 
 
 
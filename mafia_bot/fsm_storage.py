@@ -0,0 +1,201 @@
+import json
+import os
+import time
+from datetime import timedelta
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+
+from database import get_connection, release_connection
+from notify import changes, FSM_STATES_CHANGED, ORIGIN
+
+# скільки живе незавершений діалог (створення івенту, нарахування тощо)
+FSM_TTL = timedelta(hours=int(os.environ.get("FSM_TTL_HOURS", 24)))
+# страховка на випадок загубленого NOTIFY: довше локальна копія не живе (сек)
+FSM_CACHE_TTL = float(os.environ.get("FSM_CACHE_TTL", 60))
+FSM_CACHE_MAX_SIZE = 10_000
+# як часто чистити прострочені стани з бази (сек)
+FSM_PURGE_INTERVAL = 3600
+
+
+class PostgresStorage(BaseStorage):
+    """
+    FSM-сховище в таблиці fsm_states (state + data як JSONB, з TTL).
+    Спільне для всіх реплік бота; читання йдуть через локальний кеш,
+    записи — одразу в базу і в кеш (write-through).
+    Кожен запис шле NOTIFY, і інші репліки прибирають ключ зі свого кешу
+    (remote_changed) — без sticky sessions наступний апдейт користувача може
+    прийти на іншу репліку. Поки слухач змін не підключений, кеш не використовується.
+    """
+
+    def __init__(self):
+        # storage_key -> (cached_at, state, data)
+        self._cache = {}
+        # росте з кожною чужою зміною: читання, що почалося раніше, не кешується
+        self._generation = 0
+        self._last_purge = time.monotonic()
+
+    @staticmethod
+    def _key(key):
+        return ":".join(
+            str(part) if part is not None else ""
+            for part in (
+                key.bot_id,
+                key.chat_id,
+                key.user_id,
+                key.thread_id,
+                key.business_connection_id,
+                key.destiny,
+            )
+        )
+
+    def _remember(self, storage_key, state, data):
+        if len(self._cache) >= FSM_CACHE_MAX_SIZE:
+            border = time.monotonic() - FSM_CACHE_TTL
+            for k in [k for k, v in self._cache.items() if v[0] < border]:
+                del self._cache[k]
+            if len(self._cache) >= FSM_CACHE_MAX_SIZE:
+                self._cache.clear()
+        self._cache[storage_key] = (time.monotonic(), state, data)
+
+    def _cached(self, storage_key):
+        if not changes.listening:
+            return None
+        cached = self._cache.get(storage_key)
+        if cached and time.monotonic() - cached[0] < FSM_CACHE_TTL:
+            return cached
+        return None
+
+    def forget(self, storage_key):
+        """Прибирає ключ з локального кешу"""
+        self._generation += 1
+        self._cache.pop(storage_key, None)
+
+    def clear(self):
+        self._generation += 1
+        self._cache.clear()
+
+    def remote_changed(self, payload):
+        """Обробник FSM_STATES_CHANGED: стан змінила інша репліка"""
+        origin, _, storage_key = payload.partition(":")
+        if origin != ORIGIN:
+            self.forget(storage_key)
+
+    async def _load(self, key):
+        storage_key = self._key(key)
+        cached = self._cached(storage_key)
+        if cached:
+            return cached[1], cached[2]
+
+        generation = self._generation
+        conn = await get_connection()
+        try:
+            row = await conn.fetchrow(
+                """
+                SELECT state, data
+                FROM fsm_states
+                WHERE storage_key = $1
+                  AND expires_at > now()
+                """,
+                storage_key
+            )
+        finally:
+            await release_connection(conn)
+
+        state, data = (row["state"], json.loads(row["data"])) if row else (None, {})
+        if changes.listening and generation == self._generation:
+            self._remember(storage_key, state, data)
+        return state, data
+
+    async def _write(self, sql, storage_key, value):
+        conn = await get_connection()
+        try:
+            # NOTIFY іде разом із записом: інші репліки дізнаються лише про закомічене
+            async with conn.transaction():
+                await conn.execute(sql, storage_key, value, FSM_TTL)
+                await conn.execute(
+                    "SELECT pg_notify($1, $2)",
+                    FSM_STATES_CHANGED, f"{ORIGIN}:{storage_key}"
+                )
+
+            if time.monotonic() - self._last_purge > FSM_PURGE_INTERVAL:
+                self._last_purge = time.monotonic()
+                await conn.execute("DELETE FROM fsm_states WHERE expires_at <= now()")
+        finally:
+            await release_connection(conn)
+
+    async def set_state(self, key, state=None):
+        state = state.state if isinstance(state, State) else state
+        storage_key = self._key(key)
+
+        if state is None:
+            # скидання стану: новий рядок не створюємо
+            sql = """
+                UPDATE fsm_states
+                SET state = $2,
+                    data = CASE WHEN expires_at <= now() THEN '{}'::jsonb ELSE data END,
+                    expires_at = now() + $3::interval
+                WHERE storage_key = $1
+            """
+        else:
+            sql = """
+                INSERT INTO fsm_states (storage_key, state, expires_at)
+                VALUES ($1, $2, now() + $3::interval)
+                ON CONFLICT (storage_key) DO UPDATE
+                SET state = EXCLUDED.state,
+                    data = CASE WHEN fsm_states.expires_at <= now() THEN '{}'::jsonb ELSE fsm_states.data END,
+                    expires_at = EXCLUDED.expires_at
+            """
+        generation = self._generation
+        await self._write(sql, storage_key, state)
+
+        cached = self._cached(storage_key)
+        if cached and generation == self._generation:
+            self._remember(storage_key, state, cached[2])
+        else:
+            self.forget(storage_key)
+
+    async def get_state(self, key):
+        state, _ = await self._load(key)
+        return state
+
+    async def set_data(self, key, data):
+        data = dict(data)
+        storage_key = self._key(key)
+
+        if not data:
+            sql = """
+                UPDATE fsm_states
+                SET data = $2::jsonb,
+                    state = CASE WHEN expires_at <= now() THEN NULL ELSE state END,
+                    expires_at = now() + $3::interval
+                WHERE storage_key = $1
+            """
+        else:
+            sql = """
+                INSERT INTO fsm_states (storage_key, data, expires_at)
+                VALUES ($1, $2::jsonb, now() + $3::interval)
+                ON CONFLICT (storage_key) DO UPDATE
+                SET data = EXCLUDED.data,
+                    state = CASE WHEN fsm_states.expires_at <= now() THEN NULL ELSE fsm_states.state END,
+                    expires_at = EXCLUDED.expires_at
+            """
+        generation = self._generation
+        await self._write(
+            sql,
+            storage_key,
+            json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        )
+
+        cached = self._cached(storage_key)
+        if cached and generation == self._generation:
+            self._remember(storage_key, cached[1], data)
+        else:
+            self.forget(storage_key)
+
+    async def get_data(self, key):
+        _, data = await self._load(key)
+        return dict(data)
+
+    async def close(self):
+        self._cache.clear()
@@ -0,0 +1,136 @@
+import asyncio
+import os
+import socket
+
+import asyncpg
+
+from database import DATABASE_URL, get_connection, release_connection
+
+# Ідентифікатор цієї репліки (на Koyeb hostname унікальний для інстансу)
+NODE_ID = os.getenv("NODE_ID") or f"{socket.gethostname()}:{os.getpid()}"
+# як часто лідер підтверджує lease і як часто інші пробують його перехопити (сек)
+LEADER_RENEW_INTERVAL = float(os.environ.get("LEADER_RENEW_INTERVAL", 10))
+# скільки чекати відповіді бази при продовженні lease
+LEADER_RENEW_TIMEOUT = 5
+
+
+class LeaderElector:
+    """
+    Вибір лідера через pg_try_advisory_lock на окремому з'єднанні.
+    Поки з'єднання живе — lock наш; якщо воно обривається, Postgres
+    сам відпускає lock і його забирає інша репліка.
+    З'єднання одне на весь час роботи: кандидат повторює спробу на ньому ж,
+    а перепідключається лише після помилки.
+    Лідер запускає singleton-задачі (on_elected) і зупиняє їх, коли втрачає lease;
+    задачу, що впала, перезапускає на наступному продовженні lease.
+    """
+
+    def __init__(self, name, lock_key):
+        self.name = name
+        self.lock_key = lock_key
+        self.is_leader = False
+        self._conn = None
+        # [(фабрика корутини, task)]
+        self._tasks = []
+
+    async def _try_acquire(self):
+        if self._conn is None or self._conn.is_closed():
+            self._conn = await asyncpg.connect(DATABASE_URL)
+        acquired = await asyncio.wait_for(
+            self._conn.fetchval("SELECT pg_try_advisory_lock($1)", self.lock_key),
+            timeout=LEADER_RENEW_TIMEOUT
+        )
+        if not acquired:
+            return False
+
+        await self._conn.execute(
+            """
+            INSERT INTO leader_lease (name, node_id, acquired_at, renewed_at)
+            VALUES ($1, $2, now(), now())
+            ON CONFLICT (name) DO UPDATE
+            SET node_id = EXCLUDED.node_id,
+                acquired_at = EXCLUDED.acquired_at,
+                renewed_at = EXCLUDED.renewed_at
+            """,
+            self.name, NODE_ID
+        )
+        return True
+
+    async def _renew(self):
+        await asyncio.wait_for(
+            self._conn.execute(
+                "UPDATE leader_lease SET renewed_at = now() WHERE name = $1 AND node_id = $2",
+                self.name, NODE_ID
+            ),
+            timeout=LEADER_RENEW_TIMEOUT
+        )
+
+    def _start_jobs(self, jobs):
+        self._tasks = [(job, asyncio.create_task(job())) for job in jobs]
+
+    def _restart_dead_jobs(self):
+        """Singleton-задачі безкінечні: завершена задача — це збій, який інші репліки не підхоплять"""
+        for i, (job, task) in enumerate(self._tasks):
+            if not task.done():
+                continue
+            error = None if task.cancelled() else task.exception()
+            print(f"⚠️ {self.name} job {job.__qualname__} stopped ({error!r}), restarting")
+            self._tasks[i] = (job, asyncio.create_task(job()))
+
+    async def _step_down(self):
+        """Зупиняє задачі лідера і закриває з'єднання — разом з ним Postgres відпускає lock"""
+        self.is_leader = False
+        tasks = [task for _, task in self._tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+
+        if self._conn is not None:
+            try:
+                await self._conn.close(timeout=LEADER_RENEW_TIMEOUT)
+            except Exception:
+                self._conn.terminate()
+            self._conn = None
+
+    async def run(self, *jobs):
+        """jobs — фабрики корутин (напр. scheduler.run), що мають працювати лише на лідері"""
+        try:
+            while True:
+                try:
+                    if not self.is_leader:
+                        if await self._try_acquire():
+                            self.is_leader = True
+                            print(f"👑 {NODE_ID} became leader for {self.name}")
+                            self._start_jobs(jobs)
+                    else:
+                        await self._renew()
+                        self._restart_dead_jobs()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if self.is_leader:
+                        print(f"⚠️ {NODE_ID} lost leadership for {self.name}: {e}")
+                    else:
+                        print(f"⚠️ leader election error: {e}")
+                    await self._step_down()
+
+                await asyncio.sleep(LEADER_RENEW_INTERVAL)
+        finally:
+            await self._step_down()
+
+
+async def current_leader(name):
+    """Хто зараз лідер: {node_id, acquired_at, renewed_at} або None"""
+    conn = await get_connection()
+    try:
+        return await conn.fetchrow(
+            "SELECT node_id, acquired_at, renewed_at FROM leader_lease WHERE name = $1",
+            name
+        )
+    finally:
+        await release_connection(conn)
+
+
+# ================== SINGLETON JOBS ==================
+jobs_leader = LeaderElector("jobs", 7_305_002)
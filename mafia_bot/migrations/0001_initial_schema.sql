@@ -0,0 +1,33 @@
+-- Базова схема: користувачі, події (ігри), реєстрації
+
+-- Таблиця користувачів
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    username TEXT,
+    display_name TEXT,
+    role TEXT NOT NULL CHECK(role IN ('admin','player')),
+    is_active INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Таблиця подій (ігор)
+CREATE TABLE IF NOT EXISTS events (
+    event_id SERIAL PRIMARY KEY,
+    title TEXT NOT NULL,
+    event_date TEXT NOT NULL,
+    event_time TEXT NOT NULL,
+    status TEXT NOT NULL CHECK(status IN ('active','closed')),
+    created_by BIGINT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Таблиця реєстрацій
+CREATE TABLE IF NOT EXISTS registrations (
+    registration_id SERIAL PRIMARY KEY,
+    event_id INTEGER NOT NULL REFERENCES events(event_id) ON DELETE CASCADE,
+    user_id BIGINT NOT NULL REFERENCES users(user_id),
+    comment TEXT,
+    status TEXT NOT NULL CHECK(status IN ('active','cancelled')),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,37 @@
+-- Індекси під гарячі запити (реєстрації, активні івенти, розсилки)
+
+-- Перед унікальним індексом прибираємо дублікати активних записів:
+-- лишаємо найраніший запис, решту позначаємо скасованими
+UPDATE registrations r
+SET status = 'cancelled',
+    updated_at = CURRENT_TIMESTAMP
+WHERE r.status = 'active'
+  AND EXISTS (
+      SELECT 1
+      FROM registrations d
+      WHERE d.event_id = r.event_id
+        AND d.user_id = r.user_id
+        AND d.status = 'active'
+        AND d.registration_id < r.registration_id
+  );
+
+-- Один активний запис гравця на івент
+CREATE UNIQUE INDEX IF NOT EXISTS uq_registrations_active_event_user
+    ON registrations (event_id, user_id)
+    WHERE status = 'active';
+
+-- invite_join / invite_cancel / save_comment
+CREATE INDEX IF NOT EXISTS idx_registrations_event_user_status
+    ON registrations (event_id, user_id, status);
+
+-- списки гравців, адмін-звіт, розсилки по івенту
+CREATE INDEX IF NOT EXISTS idx_registrations_event_status_created
+    ON registrations (event_id, status, created_at);
+
+-- активні івенти, нагадування
+CREATE INDEX IF NOT EXISTS idx_events_status_date
+    ON events (status, event_date);
+
+-- розсилки всім активним гравцям
+CREATE INDEX IF NOT EXISTS idx_users_is_active
+    ON users (is_active);
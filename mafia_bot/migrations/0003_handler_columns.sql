@@ -0,0 +1,25 @@
+-- Приводимо схему до того, що реально використовують хендлери
+
+-- reminder_loop позначає, що нагадування вже розіслано
+ALTER TABLE events ADD COLUMN IF NOT EXISTS reminder_sent BOOLEAN NOT NULL DEFAULT false;
+
+-- create_event_date зберігає date, show_active_events викликає .strftime,
+-- а нагадування порівнює event_date з датою — колонка має бути DATE
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_name = 'events'
+          AND column_name = 'event_date'
+          AND data_type = 'text'
+    ) THEN
+        ALTER TABLE events
+            ALTER COLUMN event_date TYPE DATE
+            USING CASE
+                WHEN event_date ~ '^\d{2}\.\d{2}\.\d{4}$' THEN to_date(event_date, 'DD.MM.YYYY')
+                ELSE event_date::date
+            END;
+    END IF;
+END
+$$;
@@ -0,0 +1,36 @@
+-- Черга розсилок: хендлер лише записує отримувачів, доставляє фоновий воркер
+
+-- Одна розсилка: текст, клавіатура і куди звітувати адміну
+CREATE TABLE IF NOT EXISTS broadcasts (
+    broadcast_id SERIAL PRIMARY KEY,
+    text TEXT NOT NULL,
+    parse_mode TEXT,
+    reply_markup JSONB,
+    report_chat_id BIGINT,
+    report_message_id BIGINT,
+    done_text TEXT,
+    total INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    finished_at TIMESTAMPTZ
+);
+
+-- Отримувачі розсилки зі статусом доставки кожному
+CREATE TABLE IF NOT EXISTS outbox (
+    outbox_id BIGSERIAL PRIMARY KEY,
+    broadcast_id INTEGER NOT NULL REFERENCES broadcasts(broadcast_id) ON DELETE CASCADE,
+    chat_id BIGINT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK(status IN ('pending','sending','sent','failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    locked_at TIMESTAMPTZ,
+    sent_at TIMESTAMPTZ
+);
+
+-- воркер забирає лише недоставлене
+CREATE INDEX IF NOT EXISTS idx_outbox_undelivered
+    ON outbox (outbox_id)
+    WHERE status IN ('pending','sending');
+
+-- прогрес розсилки
+CREATE INDEX IF NOT EXISTS idx_outbox_broadcast_status
+    ON outbox (broadcast_id, status);
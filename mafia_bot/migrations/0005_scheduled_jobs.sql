@@ -0,0 +1,24 @@
+-- Відкладені задачі планувальника (нагадування тощо)
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+    job_key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    fire_at TIMESTAMPTZ NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_fire_at
+    ON scheduled_jobs (fire_at);
+
+-- Нагадування для вже створених активних івентів:
+-- о 12:00 за Києвом напередодні івенту
+INSERT INTO scheduled_jobs (job_key, kind, payload, fire_at)
+SELECT 'reminder:' || e.event_id,
+       'event_reminder',
+       jsonb_build_object('event_id', e.event_id),
+       ((e.event_date - 1) + TIME '12:00') AT TIME ZONE 'Europe/Kyiv'
+FROM events e
+WHERE e.status = 'active'
+  AND e.reminder_sent = false
+  AND ((e.event_date - 1) + TIME '12:00') AT TIME ZONE 'Europe/Kyiv' > now()
+ON CONFLICT (job_key) DO NOTHING;
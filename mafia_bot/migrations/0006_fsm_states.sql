@@ -0,0 +1,11 @@
+-- FSM-стани діалогів, спільні для всіх реплік бота
+CREATE TABLE IF NOT EXISTS fsm_states (
+    storage_key TEXT PRIMARY KEY,
+    state TEXT,
+    data JSONB NOT NULL DEFAULT '{}',
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+-- очищення прострочених станів
+CREATE INDEX IF NOT EXISTS idx_fsm_states_expires_at
+    ON fsm_states (expires_at);
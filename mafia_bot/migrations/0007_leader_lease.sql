@@ -0,0 +1,7 @@
+-- Хто з реплік зараз виконує singleton-задачі (планувальник нагадувань)
+CREATE TABLE IF NOT EXISTS leader_lease (
+    name TEXT PRIMARY KEY,
+    node_id TEXT NOT NULL,
+    acquired_at TIMESTAMPTZ NOT NULL,
+    renewed_at TIMESTAMPTZ NOT NULL
+);
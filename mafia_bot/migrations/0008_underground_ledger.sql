@@ -0,0 +1,54 @@
+-- Сезон Underground: баланси, результати й оброблені івенти тепер живуть у Postgres,
+-- а таблиця UNDERGROUND — лише копія, яку фоново оновлює експортер
+
+-- Гравці сезону (лист Players)
+CREATE TABLE IF NOT EXISTS players (
+    player_id BIGINT PRIMARY KEY,
+    nick TEXT NOT NULL,
+    balance INTEGER NOT NULL DEFAULT 0,
+    current_streak INTEGER NOT NULL DEFAULT 0,
+    total_games INTEGER NOT NULL DEFAULT 0,
+    black_mark_used INTEGER NOT NULL DEFAULT 0,
+    black_mark_type TEXT NOT NULL DEFAULT '',
+    -- рахує таблиця (лист Ratings), експортер забирає його назад
+    rating DOUBLE PRECISION NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    -- updated_at рядка, який уже є в таблиці; відрізняється — треба експортувати
+    exported_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_players_rating
+    ON players (rating DESC);
+
+-- експортер бере лише змінені
+CREATE INDEX IF NOT EXISTS idx_players_unexported
+    ON players (player_id)
+    WHERE exported_at IS DISTINCT FROM updated_at;
+
+-- Журнал нарахувань (лист Results); один бонус на гравця за івент
+CREATE TABLE IF NOT EXISTS results (
+    result_id BIGSERIAL PRIMARY KEY,
+    event_id INTEGER NOT NULL,
+    player_id BIGINT NOT NULL REFERENCES players(player_id),
+    place TEXT NOT NULL,
+    mvp INTEGER NOT NULL DEFAULT 0,
+    best_move INTEGER NOT NULL DEFAULT 0,
+    sheriff INTEGER NOT NULL DEFAULT 0,
+    income INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    exported BOOLEAN NOT NULL DEFAULT false,
+    UNIQUE (event_id, player_id, place)
+);
+
+CREATE INDEX IF NOT EXISTS idx_results_unexported
+    ON results (result_id)
+    WHERE NOT exported;
+
+-- Івенти сезону (лист Events)
+CREATE TABLE IF NOT EXISTS season_events (
+    event_id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    processed BOOLEAN NOT NULL DEFAULT false,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    exported_at TIMESTAMPTZ
+);
@@ -0,0 +1,29 @@
+-- Інкрементальний /sync_players: беремо лише користувачів, змінених після водяного знака
+
+-- коли користувача створили або змінили нік
+ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+CREATE OR REPLACE FUNCTION users_touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_users_touch_updated_at ON users;
+CREATE TRIGGER trg_users_touch_updated_at
+    BEFORE UPDATE OF display_name ON users
+    FOR EACH ROW
+    WHEN (OLD.display_name IS DISTINCT FROM NEW.display_name)
+    EXECUTE FUNCTION users_touch_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_users_updated_at
+    ON users (updated_at, user_id);
+
+-- Докуди вже синхронізовано (name -> водяний знак)
+CREATE TABLE IF NOT EXISTS sync_state (
+    name TEXT PRIMARY KEY,
+    watermark_at TIMESTAMPTZ NOT NULL,
+    watermark_id BIGINT NOT NULL DEFAULT 0,
+    synced_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,45 @@
+-- Повідомлення про зміни для кешів усіх реплік (LISTEN/NOTIFY).
+-- Канал — TG_ARGV[0], payload — значення ключової колонки TG_ARGV[1].
+-- Однакові повідомлення в межах транзакції Postgres надсилає один раз.
+
+CREATE OR REPLACE FUNCTION notify_change() RETURNS trigger AS $$
+DECLARE
+    rec RECORD;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        rec := OLD;
+    ELSE
+        rec := NEW;
+    END IF;
+    PERFORM pg_notify(TG_ARGV[0], to_jsonb(rec) ->> TG_ARGV[1]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- профіль (нік, роль); is_active кеші не цікавить
+DROP TRIGGER IF EXISTS trg_users_changed ON users;
+CREATE TRIGGER trg_users_changed
+    AFTER INSERT OR UPDATE OF display_name, role OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION notify_change('users_changed', 'user_id');
+
+-- склад і картки активних івентів; reminder_sent не впливає
+DROP TRIGGER IF EXISTS trg_events_changed ON events;
+CREATE TRIGGER trg_events_changed
+    AFTER INSERT OR UPDATE OF title, event_date, event_time, status OR DELETE ON events
+    FOR EACH ROW EXECUTE FUNCTION notify_change('events_changed', 'event_id');
+
+-- рейтинг сезону: нік, рейтинг і перша гра (з неї гравець з'являється в рейтингу),
+-- а не кожне нарахування
+DROP TRIGGER IF EXISTS trg_players_changed ON players;
+CREATE TRIGGER trg_players_changed
+    AFTER INSERT OR DELETE ON players
+    FOR EACH ROW EXECUTE FUNCTION notify_change('players_changed', 'player_id');
+
+DROP TRIGGER IF EXISTS trg_players_updated ON players;
+CREATE TRIGGER trg_players_updated
+    AFTER UPDATE OF nick, rating, total_games ON players
+    FOR EACH ROW
+    WHEN (OLD.nick IS DISTINCT FROM NEW.nick
+          OR OLD.rating IS DISTINCT FROM NEW.rating
+          OR (OLD.total_games > 0) <> (NEW.total_games > 0))
+    EXECUTE FUNCTION notify_change('players_changed', 'player_id');
@@ -0,0 +1,32 @@
+-- Дата й час івенту — один типізований момент starts_at замість event_date + TEXT event_time.
+-- Час, який не вдається розібрати (старі записи з довільним текстом), стає 00:00 за Києвом.
+
+ALTER TABLE events ADD COLUMN IF NOT EXISTS starts_at TIMESTAMPTZ;
+
+UPDATE events
+SET starts_at = (
+        event_date
+        + CASE
+              WHEN btrim(event_time) ~ '^([01]?\d|2[0-3])[:.][0-5]\d$'
+                  THEN replace(btrim(event_time), '.', ':')::time
+              ELSE TIME '00:00'
+          END
+    ) AT TIME ZONE 'Europe/Kyiv'
+WHERE starts_at IS NULL;
+
+ALTER TABLE events ALTER COLUMN starts_at SET NOT NULL;
+
+-- тригер з 0010 прив'язаний до старих колонок
+DROP TRIGGER IF EXISTS trg_events_changed ON events;
+
+DROP INDEX IF EXISTS idx_events_status_date;
+ALTER TABLE events DROP COLUMN event_date, DROP COLUMN event_time;
+
+CREATE TRIGGER trg_events_changed
+    AFTER INSERT OR UPDATE OF title, starts_at, status OR DELETE ON events
+    FOR EACH ROW EXECUTE FUNCTION notify_change('events_changed', 'event_id');
+
+-- активні івенти за часом проведення, нагадування
+CREATE INDEX IF NOT EXISTS idx_events_active_starts_at
+    ON events (starts_at)
+    WHERE status = 'active';
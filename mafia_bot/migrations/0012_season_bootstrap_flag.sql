@@ -0,0 +1,7 @@
+-- Позначка, що сезон уже перенесено з таблиці (див. exporter._bootstrap).
+-- Для баз, де імпорт відбувся до появи позначки, ставимо її одразу.
+INSERT INTO sync_state (name, watermark_at)
+SELECT 'season_bootstrap', now()
+WHERE EXISTS (SELECT 1 FROM players WHERE exported_at IS NOT NULL)
+   OR EXISTS (SELECT 1 FROM results WHERE exported)
+ON CONFLICT (name) DO NOTHING;
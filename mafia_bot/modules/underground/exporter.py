@@ -0,0 +1,290 @@
+import asyncio
+import os
+import time
+
+from database import get_connection, release_connection
+from scheduler import KYIV_TZ
+from modules.underground import sheets
+from modules.underground.gateway import run_sheets, SheetsUnavailable
+from modules.underground.leaderboard import leaderboard
+from modules.underground.ledger import SEASON_BOOTSTRAP
+
+# ================= CONFIG =================
+# як часто переносити зміни сезону з Postgres у таблицю (сек)
+SEASON_EXPORT_INTERVAL = float(os.getenv("SEASON_EXPORT_INTERVAL", 15))
+# скільки рядків кожного типу за один прохід
+SEASON_EXPORT_BATCH = int(os.getenv("SEASON_EXPORT_BATCH", 500))
+# як часто забирати з листа Ratings рейтинг, який рахує таблиця (сек)
+RATING_REFRESH_INTERVAL = float(os.getenv("RATING_REFRESH_INTERVAL", 300))
+# прохід експорту/імпорту — це кілька запитів до Google, тож довший за звичайний таймаут
+SEASON_EXPORT_TIMEOUT = float(os.getenv("SEASON_EXPORT_TIMEOUT", 120))
+# щоб перший імпорт не запустили дві репліки одночасно
+BOOTSTRAP_LOCK_KEY = 7_305_003
+
+
+# ================= BOOTSTRAP =================
+def _int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+IMPORTED_SQL = "SELECT EXISTS (SELECT 1 FROM sync_state WHERE name = $1)"
+
+
+async def _bootstrap():
+    """
+    Перший запуск: переносимо сезон з таблиці, одразу позначаючи все експортованим,
+    і ставимо позначку SEASON_BOOTSTRAP — лише після неї хендлери сезону
+    (ledger.is_bootstrapped) починають працювати.
+    Рядки, які вже є в Postgres, імпорт не чіпає.
+    """
+    conn = await get_connection()
+    try:
+        if await conn.fetchval(IMPORTED_SQL, SEASON_BOOTSTRAP):
+            return
+    finally:
+        await release_connection(conn)
+
+    players = await run_sheets(sheets.read_players, timeout=SEASON_EXPORT_TIMEOUT)
+    results = await run_sheets(sheets.read_results, timeout=SEASON_EXPORT_TIMEOUT)
+    events = await run_sheets(sheets.read_events, timeout=SEASON_EXPORT_TIMEOUT)
+
+    players = [p for p in players if _int(p.get("player_id"), None) is not None]
+    results = [r for r in results if _int(r.get("player_id"), None) is not None]
+    events = [e for e in events if _int(e.get("event_id"), None) is not None]
+
+    conn = await get_connection()
+    try:
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", BOOTSTRAP_LOCK_KEY)
+            if await conn.fetchval(IMPORTED_SQL, SEASON_BOOTSTRAP):
+                return
+
+            await conn.executemany(
+                """
+                INSERT INTO players
+                    (player_id, nick, balance, current_streak, total_games,
+                     black_mark_used, black_mark_type, updated_at, exported_at)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, now(), now())
+                ON CONFLICT (player_id) DO NOTHING
+                """,
+                [
+                    (
+                        _int(p["player_id"]),
+                        str(p.get("nick") or "NoName"),
+                        _int(p.get("balance")),
+                        _int(p.get("current_streak")),
+                        _int(p.get("total_games")),
+                        _int(p.get("black_mark_used")),
+                        str(p.get("black_mark_type") or ""),
+                    )
+                    for p in players
+                ]
+            )
+            # результати гравців, яких немає в Players (ручні правки)
+            await conn.execute(
+                """
+                INSERT INTO players (player_id, nick, updated_at, exported_at)
+                SELECT DISTINCT unnest($1::bigint[]), 'NoName', now(), now()
+                ON CONFLICT (player_id) DO NOTHING
+                """,
+                [_int(r["player_id"]) for r in results]
+            )
+            await conn.executemany(
+                """
+                INSERT INTO results
+                    (event_id, player_id, place, mvp, best_move, sheriff, income, exported)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, true)
+                ON CONFLICT (event_id, player_id, place) DO NOTHING
+                """,
+                [
+                    (
+                        _int(r.get("event_id")),
+                        _int(r["player_id"]),
+                        str(r.get("place") or ""),
+                        _int(r.get("mvp")),
+                        _int(r.get("best_move")),
+                        _int(r.get("sheriff")),
+                        _int(r.get("income")),
+                    )
+                    for r in results
+                ]
+            )
+            await conn.executemany(
+                """
+                INSERT INTO season_events (event_id, title, processed, updated_at, exported_at)
+                VALUES ($1, $2, $3, now(), now())
+                ON CONFLICT (event_id) DO NOTHING
+                """,
+                [
+                    (_int(e["event_id"]), str(e.get("title") or ""), _int(e.get("processed")) == 1)
+                    for e in events
+                ]
+            )
+            await conn.execute(
+                "INSERT INTO sync_state (name, watermark_at) VALUES ($1, now())",
+                SEASON_BOOTSTRAP
+            )
+    finally:
+        await release_connection(conn)
+
+    print(f"📥 season imported from sheets: players={len(players)} results={len(results)} events={len(events)}")
+
+
+# ================= EXPORT =================
+async def export_once():
+    """Один прохід експорту. Повертає кількість перенесених рядків"""
+    conn = await get_connection()
+    try:
+        players = await conn.fetch(
+            """
+            SELECT player_id, nick, balance, current_streak, total_games,
+                   black_mark_used, black_mark_type, updated_at
+            FROM players
+            WHERE exported_at IS DISTINCT FROM updated_at
+            ORDER BY player_id
+            LIMIT $1
+            """,
+            SEASON_EXPORT_BATCH
+        )
+        results = await conn.fetch(
+            """
+            SELECT result_id, event_id, player_id, place, mvp, best_move, sheriff, income, created_at
+            FROM results
+            WHERE NOT exported
+            ORDER BY result_id
+            LIMIT $1
+            """,
+            SEASON_EXPORT_BATCH
+        )
+        events = await conn.fetch(
+            """
+            SELECT event_id, title, processed, updated_at
+            FROM season_events
+            WHERE exported_at IS DISTINCT FROM updated_at
+            ORDER BY event_id
+            LIMIT $1
+            """,
+            SEASON_EXPORT_BATCH
+        )
+    finally:
+        await release_connection(conn)
+
+    if not (players or results or events):
+        return 0
+
+    def export():
+        # гравці раніше за результати: так у таблиці не буде результату без гравця
+        skipped = sheets.export_players([dict(p) for p in players])
+        sheets.export_results([
+            dict(r, created_at=r["created_at"].astimezone(KYIV_TZ))
+            for r in results
+        ])
+        sheets.export_events([dict(e) for e in events])
+        sheets.write_queue.flush()
+        return skipped
+
+    skipped = await run_sheets(export, timeout=SEASON_EXPORT_TIMEOUT)
+    # не записаних гравців лишаємо невивантаженими — підуть наступним проходом
+    players = [p for p in players if p["player_id"] not in skipped]
+
+    # позначаємо саме ту версію, яку відправили: новіші зміни підуть наступним проходом
+    conn = await get_connection()
+    try:
+        async with conn.transaction():
+            await conn.execute(
+                """
+                UPDATE players p
+                SET exported_at = f.updated_at
+                FROM unnest($1::bigint[], $2::timestamptz[]) AS f(player_id, updated_at)
+                WHERE p.player_id = f.player_id
+                """,
+                [p["player_id"] for p in players],
+                [p["updated_at"] for p in players]
+            )
+            await conn.execute(
+                "UPDATE results SET exported = true WHERE result_id = ANY($1::bigint[])",
+                [r["result_id"] for r in results]
+            )
+            await conn.execute(
+                """
+                UPDATE season_events e
+                SET exported_at = f.updated_at
+                FROM unnest($1::int[], $2::timestamptz[]) AS f(event_id, updated_at)
+                WHERE e.event_id = f.event_id
+                """,
+                [e["event_id"] for e in events],
+                [e["updated_at"] for e in events]
+            )
+    finally:
+        await release_connection(conn)
+
+    return len(players) + len(results) + len(events)
+
+
+async def refresh_ratings():
+    """Рейтинг рахують формули листа Ratings — забираємо його в players.rating"""
+    table = await run_sheets(sheets.get_rating_table)
+    rows = [
+        (_int(r.get("player_id"), None), r.get("rating"))
+        for r in table
+    ]
+    rows = [(pid, float(rating or 0)) for pid, rating in rows if pid is not None]
+
+    conn = await get_connection()
+    try:
+        changed = await conn.fetch(
+            """
+            UPDATE players p
+            SET rating = f.rating
+            FROM unnest($1::bigint[], $2::float8[]) AS f(player_id, rating)
+            WHERE p.player_id = f.player_id
+              AND p.rating IS DISTINCT FROM f.rating
+            RETURNING p.player_id, p.nick, p.rating, p.total_games
+            """,
+            [pid for pid, _ in rows],
+            [rating for _, rating in rows]
+        )
+    finally:
+        await release_connection(conn)
+
+    # лише змінені позиції, без перечитування всього рейтингу
+    for r in changed:
+        if r["total_games"] > 0:
+            leaderboard.update(r["player_id"], r["nick"], r["rating"])
+
+
+async def export_loop():
+    """Фоновий експорт сезону в таблицю (лише на репліці-лідері)"""
+    await sheets.connect_loop()
+
+    while True:
+        try:
+            await _bootstrap()
+            break
+        except SheetsUnavailable as e:
+            print(f"⚠️ season import postponed: {e}")
+        except Exception as e:
+            print(f"⚠️ season import failed: {e}")
+        await asyncio.sleep(SEASON_EXPORT_INTERVAL)
+
+    ratings_at = 0.0
+    while True:
+        try:
+            exported = await export_once()
+            if exported or time.monotonic() - ratings_at > RATING_REFRESH_INTERVAL:
+                await refresh_ratings()
+                ratings_at = time.monotonic()
+            if exported >= SEASON_EXPORT_BATCH:
+                # черга ще не розібрана — без паузи
+                continue
+        except asyncio.CancelledError:
+            raise
+        except SheetsUnavailable as e:
+            print(f"⚠️ season export postponed: {e}")
+        except Exception as e:
+            print(f"⚠️ season export failed: {e}")
+
+        await asyncio.sleep(SEASON_EXPORT_INTERVAL)
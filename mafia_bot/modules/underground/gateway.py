@@ -0,0 +1,37 @@
+import asyncio
+import os
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# gspread — синхронний HTTP; виконуємо його в окремих потоках,
+# щоб повільна відповідь Google не зупиняла event loop
+SHEETS_WORKERS = int(os.getenv("SHEETS_WORKERS", 4))
+SHEETS_TIMEOUT = float(os.getenv("SHEETS_TIMEOUT", 20))
+
+_executor = ThreadPoolExecutor(max_workers=SHEETS_WORKERS, thread_name_prefix="sheets")
+
+
+class SheetsUnavailable(Exception):
+    """Google Sheets зараз недоступний (ще не підключились, немає доступу тощо)"""
+
+
+class SheetsTimeout(SheetsUnavailable):
+    """Google Sheets не відповів вчасно"""
+
+
+async def run_sheets(func, *args, timeout=SHEETS_TIMEOUT, **kwargs):
+    """
+    Виконує синхронну функцію роботи з таблицею в пулі потоків.
+    Якщо за timeout секунд відповіді немає — SheetsTimeout;
+    виклик, що ще стоїть у черзі пулу, при цьому скасовується.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        raise SheetsTimeout(f"{func.__name__} timed out after {timeout}s")
+
+
+def shutdown():
+    _executor.shutdown(wait=True, cancel_futures=True)
@@ -3,20 +3,17 @@ from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command
-from modules.underground.sheets import client, SHEET_NAME
-from database import get_connection
 from modules.keyboards import admin_menu_keyboard
 from modules.keyboards import player_menu_keyboard
 from modules.underground.postgres_reader import get_active_event, get_event_players
-from modules.underground.sheets import (
+from modules.underground.ledger import (
+    accrue,
     get_player,
-    add_player,
-    update_player,
-    add_result,
-    result_exists,
-    set_black_mark,
-    get_rating_table
+    is_bootstrapped,
+    sync_players as sync_season_players,
+    set_black_mark
 )
+from modules.underground.leaderboard import leaderboard
 
 router = Router()
 
@@ -30,24 +27,6 @@ class AccrualState(StatesGroup):
 ADMIN_IDS = [444726017]
 
 
-# ================= LOGIC =================
-def calculate_income(action):
-    return {
-        "🥇 Топ 1": 150,
-        "🔥 MVP": 100,
-        "⭐️ Топ 5": 50,
-        "⚡ Хід": 150,
-        "👮 Шериф": 50,
-        "❌ Нічого": 0
-    }.get(action, 0)
-
-
-def get_max_balance(player):
-    if player.get("black_mark_type") == "limit":
-        return 3000
-    return 2500
-
-
 def get_season_menu(is_admin=False):
     keyboard = [
         [KeyboardButton(text="🏆 Мій рейтинг")],
@@ -64,6 +43,14 @@ def get_season_menu(is_admin=False):
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
 
 
+async def _season_not_ready(message):
+    """Поки сезон не перенесено з таблиці, відповідаємо «не готово»"""
+    if await is_bootstrapped():
+        return False
+    await message.answer("⏳ Сезон ще завантажується з таблиці, спробуйте за хвилину")
+    return True
+
+
 # ================= MENU =================
 @router.message(F.text == "☣️ UNDERGROUND")
 async def season_menu(message: types.Message):
@@ -91,6 +78,9 @@ async def back_to_main(message: types.Message, state: FSMContext):
 # ================= START ACCRUAL =================
 @router.message(F.text == "💰 Нарахувати")
 async def start_accrual(message: types.Message, state: FSMContext):
+    if await _season_not_ready(message):
+        return
+
     event = await get_active_event()
 
     if not event:
@@ -161,6 +151,9 @@ async def apply_action(message: types.Message, state: FSMContext):
         await start_accrual(message, state)
         return
 
+    if await _season_not_ready(message):
+        return
+
     allowed_actions = [
         "🥇 Топ 1", "🔥 MVP", "⭐️ Топ 5",
         "⚡ Хід", "👮 Шериф", "❌ Нічого"
@@ -177,47 +170,15 @@ async def apply_action(message: types.Message, state: FSMContext):
     event_id = data["event_id"]
     event_title = data["event_title"]
 
-    if result_exists(event_id, player_id, message.text):
+    # дубль, баланс і стрік рахуються атомарно — подвійне натискання чи двоє адмінів
+    # одночасно не дадуть нарахувати бонус двічі
+    accrual = await accrue(event_id, event_title, player_id, player_name, message.text)
+    if accrual is None:
         await message.answer("❌ Цей бонус вже нараховано")
         return
 
-    income = calculate_income(message.text)
-    player = get_player(player_id)
-    if not player:
-        add_player(player_id, player_name)
-        player = get_player(player_id)
-
-    balance = int(player["balance"])
-    streak = int(player["current_streak"])
-    total_games = int(player["total_games"])
-
-    max_balance = get_max_balance(player)
-    new_balance = min(balance + income, max_balance)
-    income = new_balance - balance
-
-    # 🔥 streak логіка
-    if income > 0:
-        streak += 1
-    else:
-        if player.get("black_mark_type") == "streak":
-            # використовуємо 1 раз
-            set_black_mark(player_id, "used_streak")
-        else:
-            streak = 0
-
-    total_games += 1
-
-    update_player(player_id, new_balance, streak, total_games)
-
-    add_result(
-        event_id=event_id,
-        player_id=player_id,
-        place=message.text,
-        mvp=1 if message.text == "🔥 MVP" else 0,
-        best_move=1 if message.text == "⚡ Хід" else 0,
-        sheriff=1 if message.text == "👮 Шериф" else 0,
-        income=income
-    )
+    income, new_balance = accrual["income"], accrual["balance"]
+    leaderboard.update(player_id, accrual["nick"], accrual["rating"])
 
     await message.answer(
         f"✅ {player_name}\n+{income} 💰\nБаланс: {new_balance}"
@@ -238,7 +199,10 @@ async def apply_action(message: types.Message, state: FSMContext):
 # ================= BLACK MARK =================
 @router.message(F.text.contains("Black Mark"))
 async def black_mark_menu(message: types.Message):
-    player = get_player(message.from_user.id)
+    if await _season_not_ready(message):
+        return
+
+    player = await get_player(message.from_user.id)
 
     if not player:
         await message.answer("❌ Ви ще не грали")
@@ -262,10 +226,12 @@ async def black_mark_menu(message: types.Message):
 
 @router.message(F.text.in_(["💰 Підняти ліміт до 3000", "🔥 Зберегти стрік (1 раз)"]))
 async def apply_black_mark(message: types.Message, state: FSMContext):
+    if await _season_not_ready(message):
+        return
 
     await state.clear()
 
-    player = get_player(message.from_user.id)
+    player = await get_player(message.from_user.id)
 
     if not player:
         await message.answer("❌ Ви ще не грали")
@@ -275,17 +241,23 @@ async def apply_black_mark(message: types.Message, state: FSMContext):
         await message.answer("❌ Ви вже використали Black Mark")
         return
 
-    if message.text == "💰 Підняти ліміт до 3000":
-        set_black_mark(message.from_user.id, "limit")
+    bm_type = "limit" if message.text == "💰 Підняти ліміт до 3000" else "streak"
+    if not await set_black_mark(message.from_user.id, bm_type):
+        await message.answer("❌ Ви вже використали Black Mark")
+        return
+
+    if bm_type == "limit":
         await message.answer("🫐 BLACK MARK АКТИВОВАНО\n💰 Ліміт = 3000")
     else:
-        set_black_mark(message.from_user.id, "streak")
         await message.answer("🫐 BLACK MARK АКТИВОВАНО\n🔥 Стрік буде врятовано 1 раз")
 
 # ================= MY BALANCE =================
 @router.message(F.text == "💰 Мій баланс")
 async def my_balance(message: types.Message):
-    player = get_player(message.from_user.id)
+    if await _season_not_ready(message):
+        return
+
+    player = await get_player(message.from_user.id)
 
     if not player:
         await message.answer("❌ Ви ще не брали участь у сезоні")
@@ -321,40 +293,38 @@ async def my_balance(message: types.Message):
 """
     )
 # ================= MY RATING =================
+def _render_season_top(top):
+    top_text = ""
+
+    for i, (_, nick, rating) in enumerate(top, start=1):
+        medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "▫️"
+
+        top_text += f"{medal} {nick} — {float(rating)}\n"
+
+    return top_text
+
+
 @router.message(F.text == "🏆 Мій рейтинг")
 async def my_rating(message: types.Message):
+    if await _season_not_ready(message):
+        return
 
-    players = get_rating_table()
+    await leaderboard.ensure_loaded()
 
-    if not players:
+    if not len(leaderboard):
         await message.answer("❌ Рейтинг поки не заповнений")
         return
 
-    user_id = str(message.from_user.id)
-
-    position = None
-
-    for i, p in enumerate(players, start=1):
-        if str(p.get("player_id")) == user_id:
-            position = i
-            break
+    position = leaderboard.rank(message.from_user.id)
 
     if position is None:
         await message.answer("❌ Вас немає в рейтингу")
         return
 
     # 🔝 топ 10
-    top_text = ""
-
-    for i, p in enumerate(players[:10], start=1):
-        nick = p.get("nick")
-        rating = float(p.get("rating") or 0)
-
-        medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "▫️"
+    top_text = leaderboard.render_top("season", _render_season_top)
 
-        top_text += f"{medal} {nick} — {rating}\n"
-
-    my_rating_value = float(players[position - 1].get("rating") or 0)
+    my_rating_value = float(leaderboard.rating(message.from_user.id))
 
     await message.answer(
         f"""
@@ -370,64 +340,24 @@ async def my_rating(message: types.Message):
 """
     )
 #================= SYNC POSTGRES ========================
-async def sync_players_from_db():
-    conn = await get_connection()
-    rows = await conn.fetch("SELECT user_id, display_name FROM users")
-
-    from modules.underground.sheets import client, SHEET_NAME
-    sheet = client.open(SHEET_NAME).worksheet("Players")
-
-    existing_ids = set(sheet.col_values(1))
-
-    added = 0
-
-    for row in rows:
-        user_id = str(row["user_id"])
-        nickname = row["display_name"] or "NoName"
-
-        if user_id not in existing_ids:
-            sheet.append_row([
-                user_id,
-                nickname,
-                0,
-                0,
-                0,
-                0,
-                ""
-            ])
-            added += 1
-
-    await conn.close()
-
-    return added
-
 @router.message(Command("sync_players"))
 async def sync_players(message: types.Message):
-    added = await sync_players_from_db()
-    await message.answer(f"✅ Додано гравців: {added}")
-
-#================= Rate ========================
-@router.message(F.text == "📊 Рейтинг")
-async def show_rating(message: types.Message):
-
-    sheet = client.open(SHEET_NAME).worksheet("Ratings")
-    data = sheet.get_all_records()
-
-    if not data:
-        await message.answer("❌ Рейтинг поки пустий")
+    if await _season_not_ready(message):
         return
 
-    # сортуємо по рейтингу
-    sorted_players = sorted(data, key=lambda x: float(x.get("rating", 0)), reverse=True)
+    # у таблицю зміни перенесе експортер: нові рядки одним append_rows, ніки — одним batch update
+    added, renamed = await sync_season_players()
 
-    top_10 = sorted_players[:10]
+    for player_id, nick in added + renamed:
+        leaderboard.rename(player_id, nick)
 
-    text = "🏆 ТОП-10 РЕЙТИНГУ:\n\n"
+    await message.answer(f"✅ Додано гравців: {len(added)}\n✏️ Оновлено ніків: {len(renamed)}")
 
-    for i, player in enumerate(top_10, start=1):
-        nick = player.get("nick", "Unknown")
-        rating = player.get("rating", 0)
+#================= Rate ========================
+def _render_top_10(top):
+    text = "🏆 ТОП-10 РЕЙТИНГУ:\n\n"
 
+    for i, (_, nick, rating) in enumerate(top, start=1):
         medal = ""
         if i == 1:
             medal = "🥇"
@@ -438,4 +368,18 @@ async def show_rating(message: types.Message):
 
         text += f"{medal} {i}. {nick} — {rating}\n"
 
-    await message.answer(text)
+    return text
+
+
+@router.message(F.text == "📊 Рейтинг")
+async def show_rating(message: types.Message):
+    if await _season_not_ready(message):
+        return
+
+    await leaderboard.ensure_loaded()
+
+    if not len(leaderboard):
+        await message.answer("❌ Рейтинг поки пустий")
+        return
+
+    await message.answer(leaderboard.render_top("top_10", _render_top_10))
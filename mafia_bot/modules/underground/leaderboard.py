@@ -0,0 +1,159 @@
+import asyncio
+from bisect import bisect_left, insort
+
+from modules.underground.ledger import get_rating_table, get_ratings
+
+TOP_SIZE = 10
+
+
+class Leaderboard:
+    """
+    Гравці, що вже грали в сезоні, впорядковані за рейтингом (більший — вище, далі за ніком).
+    Місце гравця — бінарний пошук, зміна рейтингу — видалення + вставка
+    без пересортування всього списку. Відрендерений топ кешується до
+    першої зміни, що його зачіпає.
+    Повністю читається лише при першому зверненні та після invalidate()
+    (загублені повідомлення); далі — update() і mark_changed() по одному гравцю.
+    """
+
+    def __init__(self):
+        # відсортовані ключі (-rating, nick, player_id)
+        self._keys = []
+        # player_id -> ключ
+        self._by_player = {}
+        self._loaded = False
+        # поки йде повне читання — player_id, змінені за цей час (їх перечитаємо після)
+        self._changed_while_loading = None
+        self._lock = asyncio.Lock()
+        # змінюється лише коли міняється топ
+        self._top_version = 0
+        # name -> (top_version, text)
+        self._rendered = {}
+        # гравці, змінені в базі (з інших реплік), ще не перечитані
+        self._stale = set()
+        self._refresh_task = None
+
+    @staticmethod
+    def _make_key(player_id, nick, rating):
+        return -float(rating or 0), str(nick or ""), int(player_id)
+
+    def _in_top(self, key):
+        return len(self._keys) <= TOP_SIZE or key <= self._keys[TOP_SIZE - 1]
+
+    def _note_change(self, player_id):
+        if self._changed_while_loading is not None:
+            self._changed_while_loading.add(int(player_id))
+
+    def _remove(self, player_id):
+        self._note_change(player_id)
+        key = self._by_player.pop(int(player_id), None)
+        if key is None:
+            return False
+        touches_top = self._in_top(key)
+        del self._keys[bisect_left(self._keys, key)]
+        return touches_top
+
+    def update(self, player_id, nick, rating):
+        """Додає гравця або оновлює його рейтинг / нік"""
+        key = self._make_key(player_id, nick, rating)
+        self._note_change(player_id)
+        if self._by_player.get(key[2]) == key:
+            return
+
+        touches_top = self._remove(player_id)
+        insort(self._keys, key)
+        self._by_player[key[2]] = key
+        if touches_top or self._in_top(key):
+            self._top_version += 1
+
+    def rename(self, player_id, nick):
+        """Новий нік гравця; хто ще не грав, у рейтинг не потрапляє"""
+        key = self._by_player.get(int(player_id))
+        if key is not None:
+            self.update(player_id, nick, -key[0])
+
+    def remove(self, player_id):
+        if self._remove(player_id):
+            self._top_version += 1
+
+    def load(self, rows):
+        self._keys = sorted(self._make_key(r["player_id"], r["nick"], r["rating"]) for r in rows)
+        self._by_player = {key[2]: key for key in self._keys}
+        self._loaded = True
+        self._top_version += 1
+
+    def invalidate(self):
+        """Наступне звернення перечитає рейтинг з бази (повідомлення про зміни могли загубитись)"""
+        self._loaded = False
+
+    def mark_changed(self, player_id):
+        """
+        Гравця змінили в базі: перечитуємо лише його рядок.
+        Зміни, що приходять пачкою (імпорт, оновлення рейтингу), читаються одним запитом.
+        """
+        self._note_change(player_id)
+        self._stale.add(int(player_id))
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_stale())
+
+    async def _refresh_stale(self):
+        # даємо решті повідомлень транзакції дійти
+        await asyncio.sleep(0)
+        while self._stale:
+            player_ids, self._stale = self._stale, set()
+            try:
+                rows = await get_ratings(player_ids)
+            except Exception as e:
+                print(f"⚠️ leaderboard refresh failed: {e}")
+                self.invalidate()
+                return
+            for r in rows:
+                self.update(r["player_id"], r["nick"], r["rating"])
+            for player_id in player_ids - {r["player_id"] for r in rows}:
+                self.remove(player_id)
+
+    async def ensure_loaded(self):
+        if self._loaded:
+            return
+        async with self._lock:
+            if self._loaded:
+                return
+            self._changed_while_loading = set()
+            try:
+                rows = await get_rating_table()
+            finally:
+                changed, self._changed_while_loading = self._changed_while_loading, None
+            self.load(rows)
+            # знімок міг не побачити зміни, що прийшли під час читання
+            for player_id in changed:
+                self.mark_changed(player_id)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def rank(self, player_id):
+        """Місце гравця (з 1) або None"""
+        key = self._by_player.get(int(player_id))
+        if key is None:
+            return None
+        return bisect_left(self._keys, key) + 1
+
+    def rating(self, player_id):
+        key = self._by_player.get(int(player_id))
+        return -key[0] if key else None
+
+    def top(self, n=TOP_SIZE):
+        """[(player_id, nick, rating)] перших n"""
+        return [(player_id, nick, -neg_rating) for neg_rating, nick, player_id in self._keys[:n]]
+
+    def render_top(self, name, render):
+        """render(top) -> str; результат кешується, поки топ не зміниться"""
+        cached = self._rendered.get(name)
+        if cached and cached[0] == self._top_version:
+            return cached[1]
+        text = render(self.top())
+        self._rendered[name] = (self._top_version, text)
+        return text
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,352 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from database import get_connection, release_connection
+
+# Сезон Underground у Postgres — джерело правди для хендлерів.
+# Таблицю UNDERGROUND оновлює exporter.py у фоні.
+
+# /sync_players перечитує користувачів, змінених за останні N секунд
+SYNC_SAFETY_LAG = 60
+# запис у sync_state: сезон з таблиці вже перенесено (exporter._bootstrap)
+SEASON_BOOTSTRAP = "season_bootstrap"
+
+PLAYER_FIELDS = """
+    player_id, nick, balance, current_streak, total_games,
+    black_mark_used, black_mark_type, rating
+"""
+
+
+_bootstrapped = False
+
+
+async def is_bootstrapped():
+    """
+    Чи перенесено сезон з таблиці. До цього хендлери сезону нічого не читають і не пишуть:
+    нарахування поверх нульових балансів імпорт потім не зміг би врахувати.
+    """
+    global _bootstrapped
+    if not _bootstrapped:
+        conn = await get_connection()
+        try:
+            _bootstrapped = await conn.fetchval(
+                "SELECT EXISTS (SELECT 1 FROM sync_state WHERE name = $1)",
+                SEASON_BOOTSTRAP
+            )
+        finally:
+            await release_connection(conn)
+    return _bootstrapped
+
+
+# ================= PLAYERS =================
+async def get_player(player_id):
+    conn = await get_connection()
+    try:
+        row = await conn.fetchrow(
+            f"SELECT {PLAYER_FIELDS} FROM players WHERE player_id = $1",
+            int(player_id)
+        )
+    finally:
+        await release_connection(conn)
+
+    return dict(row) if row else None
+
+
+async def sync_players():
+    """
+    Переносить у сезон нових користувачів бота і зміни ніків.
+    Читає лише тих, кого змінили після водяного знака (users.updated_at, user_id).
+    Повертає (added, renamed) — списки (player_id, nick).
+    """
+    conn = await get_connection()
+    try:
+        async with conn.transaction():
+            await conn.execute(
+                """
+                INSERT INTO sync_state (name, watermark_at)
+                VALUES ('players', 'epoch')
+                ON CONFLICT (name) DO NOTHING
+                """
+            )
+            # FOR UPDATE — два одночасні /sync_players не обробляють той самий відрізок
+            mark = await conn.fetchrow(
+                """
+                SELECT watermark_at, watermark_id,
+                       now() - make_interval(secs => $1) AS safe_at
+                FROM sync_state
+                WHERE name = 'players'
+                FOR UPDATE
+                """,
+                SYNC_SAFETY_LAG
+            )
+
+            users = await conn.fetch(
+                """
+                SELECT user_id, display_name, updated_at
+                FROM users
+                WHERE (updated_at, user_id) > ($1, $2)
+                ORDER BY updated_at, user_id
+                """,
+                mark["watermark_at"], mark["watermark_id"]
+            )
+            if not users:
+                return [], []
+
+            rows = await conn.fetch(
+                """
+                INSERT INTO players (player_id, nick)
+                SELECT * FROM unnest($1::bigint[], $2::text[])
+                ON CONFLICT (player_id) DO UPDATE
+                SET nick = EXCLUDED.nick,
+                    updated_at = now()
+                -- без ніку в боті не затираємо нік сезону
+                WHERE EXCLUDED.nick <> 'NoName'
+                  AND players.nick IS DISTINCT FROM EXCLUDED.nick
+                RETURNING player_id, nick, (xmax = 0) AS inserted
+                """,
+                [u["user_id"] for u in users],
+                [u["display_name"] or "NoName" for u in users]
+            )
+
+            # свіжі зміни (ще незакомічені транзакції могли отримати старіший now())
+            # перечитаємо наступного разу — повторний upsert нічого не змінить
+            last = users[-1]
+            if last["updated_at"] > mark["safe_at"]:
+                watermark = (mark["safe_at"], 0)
+            else:
+                watermark = (last["updated_at"], last["user_id"])
+            await conn.execute(
+                """
+                UPDATE sync_state
+                SET watermark_at = $1, watermark_id = $2, synced_at = now()
+                WHERE name = 'players'
+                """,
+                *watermark
+            )
+    finally:
+        await release_connection(conn)
+
+    added = [(r["player_id"], r["nick"]) for r in rows if r["inserted"]]
+    renamed = [(r["player_id"], r["nick"]) for r in rows if not r["inserted"]]
+    return added, renamed
+
+
+# ================= ACCRUAL =================
+def calculate_income(action):
+    return {
+        "🥇 Топ 1": 150,
+        "🔥 MVP": 100,
+        "⭐️ Топ 5": 50,
+        "⚡ Хід": 150,
+        "👮 Шериф": 50,
+        "❌ Нічого": 0
+    }.get(action, 0)
+
+
+def get_max_balance(player):
+    if player.get("black_mark_type") == "limit":
+        return 3000
+    return 2500
+
+
+# player_id -> [Lock, скільки корутин його тримає або чекає]
+_player_locks = {}
+
+
+@asynccontextmanager
+async def _player_lock(player_id):
+    """Нарахування одному гравцю в межах процесу йдуть по черзі"""
+    entry = _player_locks.setdefault(player_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _player_locks[player_id]
+
+
+async def accrue(event_id, event_title, player_id, nick, place):
+    """
+    Нараховує гравцю результат place за івент.
+    Перевірка дубля, новий баланс/стрік і запис результату — одна транзакція
+    під блокуванням рядка гравця (SELECT ... FOR UPDATE), тож паралельні
+    нарахування з інших реплік чекають, а не перезаписують одне одного.
+    Повертає {"income", "balance", "nick", "rating"} або None, якщо цей бонус уже нараховано.
+    """
+    player_id = int(player_id)
+    event_id = int(event_id)
+
+    async with _player_lock(player_id):
+        conn = await get_connection()
+        try:
+            async with conn.transaction():
+                await conn.execute(
+                    """
+                    INSERT INTO players (player_id, nick)
+                    VALUES ($1, $2)
+                    ON CONFLICT (player_id) DO NOTHING
+                    """,
+                    player_id, nick
+                )
+                player = await conn.fetchrow(
+                    f"SELECT {PLAYER_FIELDS} FROM players WHERE player_id = $1 FOR UPDATE",
+                    player_id
+                )
+
+                income = calculate_income(place)
+                balance = player["balance"]
+                streak = player["current_streak"]
+
+                new_balance = min(balance + income, get_max_balance(player))
+                income = new_balance - balance
+
+                # 🔥 streak логіка
+                black_mark_type = player["black_mark_type"]
+                if income > 0:
+                    streak += 1
+                elif black_mark_type == "streak":
+                    # використовуємо 1 раз
+                    black_mark_type = "used_streak"
+                else:
+                    streak = 0
+
+                # унікальний ключ (event_id, player_id, place) — перевірка дубля
+                result_id = await conn.fetchval(
+                    """
+                    INSERT INTO results (event_id, player_id, place, mvp, best_move, sheriff, income)
+                    VALUES ($1, $2, $3, $4, $5, $6, $7)
+                    ON CONFLICT (event_id, player_id, place) DO NOTHING
+                    RETURNING result_id
+                    """,
+                    event_id,
+                    player_id,
+                    place,
+                    1 if place == "🔥 MVP" else 0,
+                    1 if place == "⚡ Хід" else 0,
+                    1 if place == "👮 Шериф" else 0,
+                    income
+                )
+                if result_id is None:
+                    return None
+
+                await conn.execute(
+                    """
+                    UPDATE players
+                    SET balance = $2,
+                        current_streak = $3,
+                        total_games = total_games + 1,
+                        black_mark_type = $4,
+                        updated_at = now()
+                    WHERE player_id = $1
+                    """,
+                    player_id, new_balance, streak, black_mark_type
+                )
+                await conn.execute(
+                    """
+                    INSERT INTO season_events (event_id, title)
+                    VALUES ($1, $2)
+                    ON CONFLICT (event_id) DO NOTHING
+                    """,
+                    event_id, event_title or ""
+                )
+        finally:
+            await release_connection(conn)
+
+    return {
+        "income": income,
+        "balance": new_balance,
+        "nick": player["nick"],
+        "rating": player["rating"],
+    }
+
+
+# ================= BLACK MARK =================
+async def set_black_mark(player_id, bm_type):
+    """False — Black Mark уже використано"""
+    conn = await get_connection()
+    try:
+        updated = await conn.fetchval(
+            """
+            UPDATE players
+            SET black_mark_used = 1,
+                black_mark_type = $2,
+                updated_at = now()
+            WHERE player_id = $1
+              AND black_mark_used = 0
+            RETURNING player_id
+            """,
+            int(player_id), bm_type
+        )
+    finally:
+        await release_connection(conn)
+
+    return updated is not None
+
+
+# ================= RATING =================
+async def get_rating_table():
+    conn = await get_connection()
+    try:
+        rows = await conn.fetch(
+            """
+            SELECT player_id, nick, rating
+            FROM players
+            WHERE total_games > 0
+            ORDER BY rating DESC, nick
+            """
+        )
+    finally:
+        await release_connection(conn)
+
+    return [dict(r) for r in rows]
+
+
+async def get_ratings(player_ids):
+    """Рядки рейтингу вказаних гравців; кого немає (видалені, ще не грали) — не в рейтингу"""
+    conn = await get_connection()
+    try:
+        rows = await conn.fetch(
+            """
+            SELECT player_id, nick, rating
+            FROM players
+            WHERE player_id = ANY($1::bigint[])
+              AND total_games > 0
+            """,
+            list(player_ids)
+        )
+    finally:
+        await release_connection(conn)
+
+    return [dict(r) for r in rows]
+
+
+# ================= EVENTS =================
+async def is_event_processed(event_id):
+    conn = await get_connection()
+    try:
+        return bool(await conn.fetchval(
+            "SELECT processed FROM season_events WHERE event_id = $1",
+            int(event_id)
+        ))
+    finally:
+        await release_connection(conn)
+
+
+async def mark_event_processed(event_id, title=""):
+    conn = await get_connection()
+    try:
+        await conn.execute(
+            """
+            INSERT INTO season_events (event_id, title, processed)
+            VALUES ($1, $2, true)
+            ON CONFLICT (event_id) DO UPDATE
+            SET processed = true,
+                updated_at = now()
+            WHERE season_events.processed = false
+            """,
+            int(event_id), title
+        )
+    finally:
+        await release_connection(conn)
@@ -1,21 +1,10 @@
-from database import get_connection
+from database import get_connection, release_connection
+from active_events import active_events
 
 
 async def get_active_event():
-    conn = await get_connection()
-    try:
-        event = await conn.fetchrow(
-            """
-            SELECT event_id, title
-            FROM events
-            WHERE status = 'active'
-            ORDER BY created_at DESC
-            LIMIT 1
-            """
-        )
-        return event
-    finally:
-        await conn.close()
+    # зі знімка активних івентів — без запиту до бази
+    return await active_events.latest()
 
 
 async def get_event_players(event_id):
@@ -34,4 +23,4 @@ async def get_event_players(event_id):
         )
         return players
     finally:
-        await conn.close()
+        await release_connection(conn)
@@ -1,131 +1,521 @@
 import os
+import re
 import json
+import time
+import asyncio
+import threading
+import functools
 from datetime import datetime
 
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 
+from modules.underground.gateway import run_sheets, SheetsUnavailable
+
 
 # ================= CONFIG =================
 SHEET_NAME = "UNDERGROUND"
 
+# як довго довіряти локальній копії листа Players (сек)
+PLAYERS_CACHE_TTL = int(os.getenv("PLAYERS_CACHE_TTL", 300))
+# запис у таблицю відкладений: скидаємо раз на N секунд або при N змінах
+SHEETS_FLUSH_INTERVAL = float(os.getenv("SHEETS_FLUSH_INTERVAL", 5))
+SHEETS_FLUSH_SIZE = int(os.getenv("SHEETS_FLUSH_SIZE", 50))
+# після невдалого підключення не пробуємо знову частіше, ніж раз на N секунд
+SHEETS_RETRY_DELAY = float(os.getenv("SHEETS_RETRY_DELAY", 30))
+
 scope = [
     "https://spreadsheets.google.com/feeds",
     "https://www.googleapis.com/auth/drive"
 ]
 
 
-# ================= AUTH =================
-creds_json = os.getenv("GOOGLE_CREDENTIALS")
+# ================= CONNECTION =================
+# Підключаємось ліниво, у фоні: імпорт модуля не ходить у мережу,
+# тож бот стартує навіть без GOOGLE_CREDENTIALS чи при збої Google
+_spreadsheet = None
+# title -> Worksheet, відкриті один раз
+_worksheets = {}
+_connect_lock = threading.Lock()
+_last_failure = 0.0
+
+
+def _authorize():
+    creds_json = os.getenv("GOOGLE_CREDENTIALS")
+
+    if not creds_json:
+        raise SheetsUnavailable("❌ GOOGLE_CREDENTIALS not found")
+
+    try:
+        creds_dict = json.loads(creds_json)
+    except Exception:
+        raise SheetsUnavailable("❌ GOOGLE_CREDENTIALS is invalid JSON")
+
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
+    return gspread.authorize(creds)
+
+
+def connect():
+    """
+    Відкриває таблицю (блокуючий виклик — лише через run_sheets).
+    Поки після невдалої спроби не минуло SHEETS_RETRY_DELAY — одразу SheetsUnavailable.
+    """
+    global _spreadsheet, _last_failure
+
+    if _spreadsheet is not None:
+        return _spreadsheet
+
+    # хтось уже підключається — не чекаємо на нього, хендлер відповість "спробуйте пізніше"
+    if not _connect_lock.acquire(blocking=False):
+        raise SheetsUnavailable("Google Sheets is still connecting")
+    try:
+        if _spreadsheet is not None:
+            return _spreadsheet
+        if time.monotonic() - _last_failure < SHEETS_RETRY_DELAY:
+            raise SheetsUnavailable("Google Sheets is not connected yet")
+
+        try:
+            spreadsheet = _authorize().open(SHEET_NAME)
+            for title in ("Players", "Results", "Events", "Ratings"):
+                _worksheets[title] = spreadsheet.worksheet(title)
+        except SheetsUnavailable:
+            _last_failure = time.monotonic()
+            raise
+        except Exception as e:
+            _last_failure = time.monotonic()
+            raise SheetsUnavailable(f"Google Sheets connection failed: {e}") from e
+
+        _spreadsheet = spreadsheet
+        return _spreadsheet
+    finally:
+        _connect_lock.release()
+
+
+def is_ready():
+    return _spreadsheet is not None
+
+
+def worksheet(title):
+    connect()
+    return _worksheets[title]
+
+
+async def connect_loop():
+    """Фонове підключення при старті; повторює, доки таблиця не відкриється"""
+    while not is_ready():
+        try:
+            await run_sheets(connect)
+            print("📗 Google Sheets connected")
+        except SheetsUnavailable as e:
+            print(f"⚠️ {e}")
+        except Exception as e:
+            print(f"⚠️ Google Sheets connection failed: {e}")
+        if not is_ready():
+            await asyncio.sleep(SHEETS_RETRY_DELAY)
+
+
+# ================= WRITE-BEHIND QUEUE =================
+class SheetWriteQueue:
+    """
+    Накопичує записи в таблицю і відправляє їх пачками:
+    усі нові рядки листа — одним append_rows, усі зміни клітинок — одним
+    values_batch_update на всю таблицю. Повторний запис у ту саму клітинку
+    замінює попередній, а зміни ще не відправленого рядка правлять сам рядок.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # одночасно лише одна відправка, щоб рядки йшли в таблицю по порядку
+        self._flush_lock = threading.Lock()
+        # (title, "C5") -> value
+        self._cells = {}
+        # title -> [(key, row_values)]
+        self._appends = {}
+        # (title, key) -> row_values — щоб правити рядок до відправки
+        self._pending_rows = {}
+        # (title, key) -> {column: value}: рядок уже відправляється, номер ще невідомий;
+        # правки стануть клітинками, щойно append_rows поверне номер рядка
+        self._inflight_rows = {}
+        self._worksheets = {}
+
+    def size(self):
+        with self._lock:
+            return len(self._cells) + sum(len(rows) for rows in self._appends.values())
+
+    def update_cell(self, worksheet, a1, value):
+        with self._lock:
+            self._worksheets[worksheet.title] = worksheet
+            self._cells[(worksheet.title, a1)] = value
+        self._flush_if_full()
+
+    def append_row(self, worksheet, row, key=None):
+        with self._lock:
+            self._worksheets[worksheet.title] = worksheet
+            row = list(row)
+            self._appends.setdefault(worksheet.title, []).append((key, row))
+            if key is not None:
+                self._pending_rows[(worksheet.title, key)] = row
+        self._flush_if_full()
+
+    def update_pending_row(self, worksheet, key, values):
+        """
+        Правка ще не відправленого рядка, values: {індекс_колонки: значення}.
+        False — якщо рядок уже в таблиці (номер рядка відомий з add-кешу).
+        """
+        with self._lock:
+            row = self._pending_rows.get((worksheet.title, key))
+            if row is not None:
+                for column, value in values.items():
+                    row[column] = value
+                return True
+            inflight = self._inflight_rows.get((worksheet.title, key))
+            if inflight is not None:
+                inflight.update(values)
+                return True
+            return False
+
+    def _flush_if_full(self):
+        if self.size() >= SHEETS_FLUSH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """
+        Відправляє все накопичене. Повертає {(title, key): номер_рядка}
+        для доданих рядків з ключем.
+        """
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            cells, self._cells = self._cells, {}
+            appends, self._appends = self._appends, {}
+            for pending_key in self._pending_rows:
+                self._inflight_rows[pending_key] = {}
+            self._pending_rows = {}
+
+        appended = {}
+        try:
+            # спочатку нові рядки, потім клітинки
+            for title in list(appends):
+                rows = appends[title]
+                response = self._worksheets[title].append_rows(
+                    [row for _, row in rows],
+                    value_input_option="RAW"
+                )
+                start = _appended_row(response)
+                row_numbers = {
+                    key: start + offset
+                    for offset, (key, _) in enumerate(rows)
+                    if key is not None
+                }
+                del appends[title]
+
+                # номер рядка — в кеш раніше, ніж рядок перестане бути «в дорозі»:
+                # інакше _write_player_cells не знайде його ні там, ні там
+                if title == "Players":
+                    for key, row_number in row_numbers.items():
+                        _player_rows[str(key)] = row_number
+                with self._lock:
+                    for key, row_number in row_numbers.items():
+                        appended[(title, key)] = row_number
+                        for column, value in self._inflight_rows.pop((title, key), {}).items():
+                            cells[(title, f"{chr(ord('A') + column)}{row_number}")] = value
+
+            if cells:
+                connect().values_batch_update({
+                    "valueInputOption": "RAW",
+                    "data": [
+                        {"range": f"'{title}'!{a1}", "values": [[value]]}
+                        for (title, a1), value in cells.items()
+                    ]
+                })
+                cells = {}
+        except Exception:
+            # повертаємо невідправлене в чергу (новіші значення важливіші)
+            with self._lock:
+                for k, v in cells.items():
+                    self._cells.setdefault(k, v)
+                for title, rows in appends.items():
+                    self._appends[title] = rows + self._appends.get(title, [])
+                    for key, row in rows:
+                        if key is None:
+                            continue
+                        # правки, що прийшли під час невдалої відправки, — в сам рядок
+                        for column, value in self._inflight_rows.pop((title, key), {}).items():
+                            row[column] = value
+                        self._pending_rows.setdefault((title, key), row)
+            raise
+
+        return appended
+
+
+write_queue = SheetWriteQueue()
+
+
+def flush_writes():
+    """Примусово відправити всі відкладені записи (напр. при зупинці бота)"""
+    write_queue.flush()
+
+
+async def flush_loop():
+    """Фонове скидання черги записів раз на SHEETS_FLUSH_INTERVAL секунд"""
+    while True:
+        await asyncio.sleep(SHEETS_FLUSH_INTERVAL)
+        try:
+            if write_queue.size():
+                await run_sheets(write_queue.flush)
+        except Exception as e:
+            print(f"⚠️ sheets flush failed: {e}")
+
+# ================= PLAYERS CACHE =================
+# player_id -> рядок листа Players (ключі без пробілів)
+_players = {}
+# player_id -> номер рядка в листі
+_player_rows = {}
+_players_loaded_at = 0.0
+# функції викликаються з пулу потоків (gateway) — кеш змінюємо під lock
+_players_lock = threading.RLock()
+
+
+def _players_locked(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _players_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+@_players_locked
+def _load_players():
+    global _players_loaded_at
+    # відкладені записи мають потрапити в таблицю до перечитування
+    write_queue.flush()
+    data = worksheet("Players").get_all_records()
+
+    _players.clear()
+    _player_rows.clear()
+    for i, row in enumerate(data, start=2):
+        # 👉 очищаємо ключі від пробілів
+        clean_row = {k.strip(): v for k, v in row.items()}
+        player_id = str(clean_row.get("player_id"))
+        _players[player_id] = clean_row
+        _player_rows[player_id] = i
 
-if not creds_json:
-    raise Exception("❌ GOOGLE_CREDENTIALS not found")
+    _players_loaded_at = time.monotonic()
 
-try:
-    creds_dict = json.loads(creds_json)
-except Exception:
-    raise Exception("❌ GOOGLE_CREDENTIALS is invalid JSON")
 
-creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-client = gspread.authorize(creds)
+def _ensure_players():
+    if time.monotonic() - _players_loaded_at > PLAYERS_CACHE_TTL:
+        _load_players()
 
 
-# ================= OPEN SHEET =================
-spreadsheet = client.open(SHEET_NAME)
+def invalidate_players():
+    """Наступне звернення перечитає лист Players"""
+    global _players_loaded_at
+    _players_loaded_at = 0.0
 
-players_sheet = spreadsheet.worksheet("Players")
-results_sheet = spreadsheet.worksheet("Results")
-events_sheet = spreadsheet.worksheet("Events")
-rating_sheet = spreadsheet.worksheet("Ratings")
 
-# ================= PLAYERS =================
-def get_player(player_id):
-    data = players_sheet.get_all_records()
+def _appended_row(response):
+    """Номер рядка з відповіді append_row ("Players!A15:G15" -> 15)"""
+    updated_range = response["updates"]["updatedRange"]
+    return int(re.search(r"(\d+)(?::[A-Z]+\d+)?$", updated_range).group(1))
 
-    for row in data:
-        # 👉 очищаємо ключі від пробілів
-        clean_row = {k.strip(): v for k, v in row.items()}
 
-        if str(clean_row.get("player_id")) == str(player_id):
-            return clean_row
+# ================= EXPORT: PLAYERS =================
+# колонки листа Players по порядку
+PLAYER_COLUMNS = [
+    "player_id",
+    "nick",
+    "balance",
+    "current_streak",
+    "total_games",
+    "black_mark_used",
+    "black_mark_type",
+]
 
-    return None
 
+def _write_player_cells(player_id, values):
+    """
+    values: {індекс_колонки: значення}, 0 = A.
+    False — рядок гравця невідомий (нічого не записано).
+    """
+    player_id = str(player_id)
+    if write_queue.update_pending_row(worksheet("Players"), player_id, values):
+        return True
 
-def add_player(player_id, nick):
-    players_sheet.append_row([
-        player_id,
-        nick,
-        0,  # balance
-        0,  # current_streak
-        0,  # total_games
-        0,  # black_mark_used
-        ""  # black_mark_type
-    ])
+    i = _player_rows.get(player_id)
+    if i is None:
+        return False
 
+    for column, value in values.items():
+        write_queue.update_cell(worksheet("Players"), f"{chr(ord('A') + column)}{i}", value)
+    return True
 
-def update_player(player_id, balance, streak, total_games):
-    data = players_sheet.get_all_records()
 
-    for i, row in enumerate(data, start=2):
-        if str(row["player_id"]) == str(player_id):
-            players_sheet.update(f"C{i}", [[balance]])
-            players_sheet.update(f"D{i}", [[streak]])
-            players_sheet.update(f"E{i}", [[total_games]])
-            break
-
-
-# ================= RESULTS =================
-def add_result(event_id, player_id, place, mvp, best_move, sheriff, income):
-    results_sheet.append_row([
-        event_id,
-        player_id,
-        place,
-        mvp,
-        best_move,
-        sheriff,
-        income,
-        datetime.now().strftime("%Y-%m-%d %H:%M")
-    ])
+@_players_locked
+def export_players(players):
+    """
+    Переносить гравців (рядки з Postgres) у лист Players.
+    Пишемо лише клітинки, що відрізняються від таблиці; нових гравців дописуємо в кінець.
+    Повертає player_id, яких записати не вдалося (рядок у листі невідомий) —
+    їх не можна позначати експортованими.
+    """
+    _ensure_players()
+    skipped = set()
 
+    for player in players:
+        player_id = str(player["player_id"])
+        values = [player[c] for c in PLAYER_COLUMNS]
+        current = _players.get(player_id)
 
-def result_exists(event_id, player_id, place):
-    data = results_sheet.get_all_records()
+        if current is None:
+            write_queue.append_row(worksheet("Players"), values, key=player_id)
+        else:
+            changed = {
+                column: value
+                for column, value in enumerate(values)
+                if column and str(current.get(PLAYER_COLUMNS[column], "")) != str(value)
+            }
+            if changed and not _write_player_cells(player_id, changed):
+                skipped.add(player["player_id"])
+                continue
 
-    for row in data:
-        if (
-            str(row["event_id"]) == str(event_id)
-            and str(row["player_id"]) == str(player_id)
-            and str(row["place"]) == str(place)
-        ):
-            return True
+        _players[player_id] = dict(zip(PLAYER_COLUMNS, values))
+
+    if skipped:
+        # номери рядків перечитаємо наступного проходу
+        invalidate_players()
+    return skipped
 
-    return False
 
+def read_players():
+    """Усі рядки листа Players (для першого імпорту в Postgres)"""
+    data = worksheet("Players").get_all_records()
+    return [{k.strip(): v for k, v in row.items()} for row in data]
 
-# ================= EVENTS =================
-def is_event_processed(event_id):
-    data = events_sheet.get_all_records()
 
+# ================= EXPORT: RESULTS =================
+# ключі (event_id, player_id, place) усіх записаних результатів;
+# лист Results лише росте, тож читаємо його один раз, далі доповнюємо з add_result
+_result_keys = set()
+_result_keys_loaded = False
+_results_lock = threading.Lock()
+
+
+def _result_key(event_id, player_id, place):
+    return str(event_id), str(player_id), str(place)
+
+
+def _ensure_result_keys():
+    global _result_keys_loaded
+    if _result_keys_loaded:
+        return
+
+    data = worksheet("Results").get_all_records()
+
+    _result_keys.clear()
     for row in data:
-        if str(row["event_id"]) == str(event_id):
-            return int(row.get("processed", 0)) == 1
+        _result_keys.add(_result_key(row["event_id"], row["player_id"], row["place"]))
+    _result_keys_loaded = True
 
-    return False
 
+def invalidate_results():
+    """Наступна перевірка перечитає лист Results (напр. після ручних правок)"""
+    global _result_keys_loaded
+    with _results_lock:
+        _result_keys_loaded = False
 
-def mark_event_processed(event_id):
-    data = events_sheet.get_all_records()
 
-    for i, row in enumerate(data, start=2):
-        if str(row["event_id"]) == str(event_id):
-            events_sheet.update(f"C{i}", 1)
-            break
+def add_result(event_id, player_id, place, mvp, best_move, sheriff, income, created_at=None):
+    with _results_lock:
+        write_queue.append_row(worksheet("Results"), [
+            event_id,
+            player_id,
+            place,
+            mvp,
+            best_move,
+            sheriff,
+            income,
+            (created_at or datetime.now()).strftime("%Y-%m-%d %H:%M")
+        ])
+        if _result_keys_loaded:
+            _result_keys.add(_result_key(event_id, player_id, place))
+
+
+def result_exists(event_id, player_id, place):
+    with _results_lock:
+        if not _result_keys_loaded:
+            # відкладені результати теж мають потрапити в лист до читання
+            write_queue.flush()
+            _ensure_result_keys()
+        return _result_key(event_id, player_id, place) in _result_keys
+
+
+def export_results(results):
+    """
+    Дописує результати в лист Results.
+    Уже наявні пропускаємо — повторний експорт після збою не дублює рядки.
+    """
+    for r in results:
+        if result_exists(r["event_id"], r["player_id"], r["place"]):
+            continue
+        add_result(
+            r["event_id"],
+            r["player_id"],
+            r["place"],
+            r["mvp"],
+            r["best_move"],
+            r["sheriff"],
+            r["income"],
+            created_at=r["created_at"]
+        )
+
+
+def read_results():
+    """Усі рядки листа Results (для першого імпорту в Postgres)"""
+    data = worksheet("Results").get_all_records()
+    return [{k.strip(): v for k, v in row.items()} for row in data]
+
+
+# ================= EXPORT: EVENTS =================
+def export_events(events):
+    """Оновлює лист Events; колонки шукаємо за заголовками (event_id, title, processed)"""
+    ws = worksheet("Events")
+    values = ws.get_all_values()
+    header = [h.strip() for h in values[0]] if values else ["event_id", "title", "processed"]
+    rows = {
+        str(row[0]): i
+        for i, row in enumerate(values[1:], start=2)
+        if row
+    }
+
+    for event in events:
+        fields = {
+            "event_id": event["event_id"],
+            "title": event["title"],
+            "processed": 1 if event["processed"] else 0,
+        }
+        i = rows.get(str(event["event_id"]))
+        if i is None:
+            write_queue.append_row(ws, [fields.get(h, "") for h in header])
+            continue
+
+        for name, value in fields.items():
+            if name != "event_id" and name in header:
+                write_queue.update_cell(ws, f"{chr(ord('A') + header.index(name))}{i}", value)
+
+
+def read_events():
+    """Усі рядки листа Events (для першого імпорту в Postgres)"""
+    data = worksheet("Events").get_all_records()
+    return [{k.strip(): v for k, v in row.items()} for row in data]
 
 
 # ================= RATING =================
 def get_rating_table():
-    data = rating_sheet.get_all_records()
+    """Лист Ratings (рейтинг рахують формули таблиці), від більшого до меншого"""
+    data = worksheet("Ratings").get_all_records()
 
     clean = [{k.strip(): v for k, v in row.items()} for row in data]
 
@@ -134,13 +524,3 @@ def get_rating_table():
         key=lambda x: float(x.get("rating") or 0),
         reverse=True
     )
-
-# ================= BLACK MARK =================
-def set_black_mark(player_id, bm_type):
-    data = players_sheet.get_all_records()
-
-    for i, row in enumerate(data, start=2):
-        if str(row["player_id"]) == str(player_id):
-            players_sheet.update(f"F{i}", [[1]])
-            players_sheet.update(f"G{i}", [[bm_type]])
-            break
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import uuid
+
+import asyncpg
+
+from database import DATABASE_URL
+
+# пауза перед повторним підключенням слухача (сек)
+NOTIFY_RECONNECT_DELAY = float(os.environ.get("NOTIFY_RECONNECT_DELAY", 5))
+# як часто перевіряти, що з'єднання слухача живе (сек)
+NOTIFY_HEALTHCHECK_INTERVAL = 30
+
+# канали, які публікують тригери з migrations/0010_change_notifications.sql
+USERS_CHANGED = "users_changed"
+EVENTS_CHANGED = "events_changed"
+PLAYERS_CHANGED = "players_changed"
+# шле scheduler.schedule()/cancel(), payload — job_key
+SCHEDULED_JOBS_CHANGED = "scheduled_jobs_changed"
+# шле PostgresStorage при записі, payload — "<ORIGIN>:<storage_key>"
+FSM_STATES_CHANGED = "fsm_states_changed"
+
+# ідентифікатор процесу — щоб не реагувати на власні повідомлення
+ORIGIN = uuid.uuid4().hex[:12]
+
+
+class ChangeListener:
+    """
+    LISTEN на окремому з'єднанні: кожна репліка дізнається про зміни в базі
+    (зроблені будь-ким) і прибирає з локальних кешів саме ці ключі.
+    Поки слухача немає (обрив, перепідключення), повідомлення губляться —
+    тому після кожного підключення кеші скидаються повністю (reset).
+    """
+
+    def __init__(self):
+        # channel -> [callback(key: str)]
+        self._handlers = {}
+        # callback() — після підключення, бо пропущені зміни невідомі
+        self._reconnect_handlers = []
+        self._conn = None
+        # True, лише поки LISTEN активний — інакше кеші не знають про чужі зміни
+        self.listening = False
+
+    def on(self, channel, callback=None, reset=None):
+        """
+        callback(key) викликається на кожне повідомлення каналу;
+        reset() — після (пере)підключення слухача.
+        """
+        if callback is not None:
+            self._handlers.setdefault(channel, []).append(callback)
+        if reset is not None:
+            self._reconnect_handlers.append(reset)
+
+    def _dispatch(self, conn, pid, channel, payload):
+        for callback in self._handlers.get(channel, ()):
+            try:
+                callback(payload)
+            except Exception as e:
+                print(f"⚠️ {channel} handler failed: {e}")
+
+    def _reset_all(self):
+        for reset in self._reconnect_handlers:
+            try:
+                reset()
+            except Exception as e:
+                print(f"⚠️ cache reset failed: {e}")
+
+    async def _listen(self):
+        self._conn = await asyncpg.connect(DATABASE_URL)
+        lost = asyncio.Event()
+
+        def on_lost(conn):
+            self.listening = False
+            lost.set()
+
+        self._conn.add_termination_listener(on_lost)
+
+        for channel in self._handlers:
+            await self._conn.add_listener(channel, self._dispatch)
+        self._reset_all()
+        self.listening = True
+        print(f"📡 listening for changes: {', '.join(self._handlers)}")
+
+        while not lost.is_set():
+            try:
+                await asyncio.wait_for(lost.wait(), timeout=NOTIFY_HEALTHCHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                # напівмертве TCP-з'єднання termination listener не помітить
+                await asyncio.wait_for(self._conn.execute("SELECT 1"), timeout=NOTIFY_HEALTHCHECK_INTERVAL)
+
+    async def _close(self):
+        self.listening = False
+        if self._conn is None:
+            return
+        try:
+            await self._conn.close(timeout=5)
+        except Exception:
+            self._conn.terminate()
+        self._conn = None
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    await self._listen()
+                    print("⚠️ change listener connection lost")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"⚠️ change listener error: {e}")
+                await self._close()
+                await asyncio.sleep(NOTIFY_RECONNECT_DELAY)
+        finally:
+            await self._close()
+
+
+changes = ChangeListener()
@@ -0,0 +1,320 @@
+import asyncio
+import os
+import time
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup
+
+from database import get_connection, release_connection
+from broadcaster import broadcast, progress_text, PROGRESS_INTERVAL
+
+# ================== CONFIG ==================
+# скільки отримувачів воркер забирає за раз
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", 100))
+# через скільки секунд "зависла" (після рестарту) порція повертається в чергу
+OUTBOX_LOCK_TIMEOUT = int(os.environ.get("OUTBOX_LOCK_TIMEOUT", 120))
+# поки порція доставляється, locked_at оновлюється з таким інтервалом —
+# довга доставка (RetryAfter, таймаути) не віддасть її іншому воркеру
+OUTBOX_HEARTBEAT_INTERVAL = OUTBOX_LOCK_TIMEOUT / 4
+# як часто перевіряти чергу, якщо нас ніхто не розбудив (розсилки інших реплік)
+OUTBOX_POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", 30))
+# скільки разів пробувати доставити при тимчасових помилках
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 3))
+
+_wakeup = asyncio.Event()
+_last_progress = {}
+
+
+# ================== ENQUEUE ==================
+async def enqueue_broadcast(
+    chat_ids,
+    text,
+    parse_mode=None,
+    reply_markup=None,
+    report_chat_id=None,
+    report_message_id=None,
+    done_text=None,
+    conn=None,
+):
+    """
+    Записує розсилку в outbox і одразу повертає broadcast_id.
+    report_message_id — повідомлення адміна, де показується прогрес;
+    якщо його немає, а є report_chat_id — done_text надсилається новим повідомленням.
+    done_text може містити {sent} і {failed}.
+    conn — щоб записати розсилку в одній транзакції з іншими змінами.
+    Порожню розсилку одразу позначаємо завершеною — звіт про неї шле сам хендлер.
+    """
+    chat_ids = list(chat_ids)
+    markup_json = reply_markup.model_dump_json(exclude_none=True) if reply_markup else None
+
+    own_conn = conn is None
+    if own_conn:
+        conn = await get_connection()
+    try:
+        async with conn.transaction():
+            broadcast_id = await conn.fetchval(
+                """
+                INSERT INTO broadcasts
+                    (text, parse_mode, reply_markup, report_chat_id, report_message_id, done_text, total,
+                     finished_at)
+                VALUES ($1, $2, $3::jsonb, $4, $5, $6, $7, CASE WHEN $7 = 0 THEN now() END)
+                RETURNING broadcast_id
+                """,
+                text, parse_mode, markup_json,
+                report_chat_id, report_message_id, done_text, len(chat_ids)
+            )
+            await conn.execute(
+                """
+                INSERT INTO outbox (broadcast_id, chat_id)
+                SELECT $1, unnest($2::bigint[])
+                """,
+                broadcast_id, chat_ids
+            )
+    finally:
+        if own_conn:
+            await release_connection(conn)
+
+    _wakeup.set()
+    return broadcast_id
+
+
+# ================== WORKER ==================
+async def _claim_batch(conn):
+    return await conn.fetch(
+        """
+        UPDATE outbox
+        SET status = 'sending',
+            locked_at = now()
+        WHERE outbox_id IN (
+            SELECT outbox_id
+            FROM outbox
+            WHERE status = 'pending'
+               OR (status = 'sending' AND locked_at < now() - make_interval(secs => $2))
+            ORDER BY outbox_id
+            LIMIT $1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING outbox_id, broadcast_id, chat_id
+        """,
+        OUTBOX_BATCH_SIZE,
+        OUTBOX_LOCK_TIMEOUT
+    )
+
+
+async def _touch_batch(outbox_ids):
+    """Продовжує блокування порції, поки її доставка не закінчиться"""
+    while True:
+        await asyncio.sleep(OUTBOX_HEARTBEAT_INTERVAL)
+        try:
+            conn = await get_connection()
+            try:
+                await conn.execute(
+                    """
+                    UPDATE outbox SET locked_at = now()
+                    WHERE outbox_id = ANY($1::bigint[])
+                      AND status = 'sending'
+                    """,
+                    outbox_ids
+                )
+            finally:
+                await release_connection(conn)
+        except Exception as e:
+            print(f"⚠️ outbox heartbeat failed: {e}")
+
+
+async def _load_broadcasts(conn, broadcast_ids):
+    rows = await conn.fetch(
+        """
+        SELECT broadcast_id, text, parse_mode, reply_markup
+        FROM broadcasts
+        WHERE broadcast_id = ANY($1::int[])
+        """,
+        broadcast_ids
+    )
+    return {b["broadcast_id"]: b for b in rows}
+
+
+async def _deliver_batch(bot, rows, broadcasts):
+    """
+    Доставляє порцію.
+    Повертає (sent_ids, failed_ids, failed_errors, failed_permanent, unreachable_chat_ids)
+    """
+    sent_ids = []
+    failed_ids = []
+    failed_errors = []
+    failed_permanent = []
+    unreachable = set()
+
+    for broadcast_id, b in broadcasts.items():
+        outbox_ids = {r["chat_id"]: r["outbox_id"] for r in rows if r["broadcast_id"] == broadcast_id}
+
+        kwargs = {}
+        if b["parse_mode"]:
+            kwargs["parse_mode"] = b["parse_mode"]
+        if b["reply_markup"]:
+            kwargs["reply_markup"] = InlineKeyboardMarkup.model_validate_json(b["reply_markup"])
+
+        result = await broadcast(bot, outbox_ids.keys(), b["text"], **kwargs)
+
+        for chat_id, outbox_id in outbox_ids.items():
+            if chat_id in result.errors:
+                failed_ids.append(outbox_id)
+                failed_errors.append(result.errors[chat_id])
+                failed_permanent.append(chat_id in result.unreachable)
+            else:
+                sent_ids.append(outbox_id)
+        unreachable |= result.unreachable
+
+    return sent_ids, failed_ids, failed_errors, failed_permanent, sorted(unreachable)
+
+
+async def _record_results(conn, sent_ids, failed_ids, failed_errors, failed_permanent, unreachable):
+    await conn.execute(
+        """
+        UPDATE outbox
+        SET status = 'sent',
+            attempts = attempts + 1,
+            sent_at = now()
+        WHERE outbox_id = ANY($1::bigint[])
+        """,
+        sent_ids
+    )
+    # тимчасові помилки повертаємо в чергу, поки не вичерпані спроби
+    await conn.execute(
+        """
+        UPDATE outbox o
+        SET status = CASE
+                WHEN f.permanent OR o.attempts + 1 >= $4 THEN 'failed'
+                ELSE 'pending'
+            END,
+            attempts = o.attempts + 1,
+            last_error = f.error
+        FROM unnest($1::bigint[], $2::text[], $3::bool[]) AS f(outbox_id, error, permanent)
+        WHERE o.outbox_id = f.outbox_id
+        """,
+        failed_ids,
+        failed_errors,
+        failed_permanent,
+        OUTBOX_MAX_ATTEMPTS
+    )
+
+    # хто заблокував бота — більше не потрапляє в розсилки
+    if unreachable:
+        await conn.execute(
+            """
+            UPDATE users
+            SET is_active = 0
+            WHERE user_id = ANY($1::bigint[])
+              AND is_active = 1
+            """,
+            unreachable
+        )
+        print(f"🚫 deactivated unreachable users: {len(unreachable)}")
+
+
+async def _report_progress(bot, conn, broadcast_ids):
+    stats = await conn.fetch(
+        """
+        SELECT b.broadcast_id, b.total, b.report_chat_id, b.report_message_id, b.done_text,
+               COUNT(*) FILTER (WHERE o.status = 'sent') AS sent,
+               COUNT(*) FILTER (WHERE o.status = 'failed') AS failed,
+               COUNT(*) FILTER (WHERE o.status IN ('pending','sending')) AS remaining
+        FROM broadcasts b
+        JOIN outbox o ON o.broadcast_id = b.broadcast_id
+        WHERE b.broadcast_id = ANY($1::int[])
+          AND b.finished_at IS NULL
+        GROUP BY b.broadcast_id
+        """,
+        broadcast_ids
+    )
+
+    for s in stats:
+        broadcast_id = s["broadcast_id"]
+        chat_id, message_id = s["report_chat_id"], s["report_message_id"]
+
+        if s["remaining"] == 0:
+            # лише одна репліка/воркер звітує про завершення
+            finished = await conn.fetchval(
+                """
+                UPDATE broadcasts SET finished_at = now()
+                WHERE broadcast_id = $1 AND finished_at IS NULL
+                RETURNING broadcast_id
+                """,
+                broadcast_id
+            )
+            _last_progress.pop(broadcast_id, None)
+            if not finished or not chat_id or not s["done_text"]:
+                continue
+
+            # не .format(): у назві івенту можуть бути фігурні дужки
+            text = s["done_text"].replace("{sent}", str(s["sent"])).replace("{failed}", str(s["failed"]))
+            try:
+                if message_id:
+                    await bot.edit_message_text(
+                        text, chat_id=chat_id, message_id=message_id, parse_mode="Markdown"
+                    )
+                else:
+                    await bot.send_message(chat_id, text, parse_mode="Markdown")
+            except Exception as e:
+                print(f"⚠️ broadcast report failed: {e}")
+            continue
+
+        if not chat_id or not message_id:
+            continue
+        if time.monotonic() - _last_progress.get(broadcast_id, 0) < PROGRESS_INTERVAL:
+            continue
+        _last_progress[broadcast_id] = time.monotonic()
+
+        try:
+            await bot.edit_message_text(
+                progress_text(s["sent"] + s["failed"], s["total"], s["sent"], s["failed"]),
+                chat_id=chat_id,
+                message_id=message_id
+            )
+        except TelegramBadRequest:
+            pass
+
+
+async def outbox_worker(bot):
+    """Фоновий воркер: забирає порції з outbox і доставляє їх"""
+    print("📤 outbox worker started")
+    while True:
+        _wakeup.clear()
+        rows = None
+        try:
+            # з'єднання не тримаємо, поки йде доставка
+            conn = await get_connection()
+            try:
+                rows = await _claim_batch(conn)
+                if rows:
+                    broadcasts = await _load_broadcasts(conn, sorted({r["broadcast_id"] for r in rows}))
+            finally:
+                await release_connection(conn)
+
+            if rows:
+                heartbeat = asyncio.create_task(_touch_batch([r["outbox_id"] for r in rows]))
+                try:
+                    results = await _deliver_batch(bot, rows, broadcasts)
+                finally:
+                    heartbeat.cancel()
+
+                conn = await get_connection()
+                try:
+                    await _record_results(conn, *results)
+                    await _report_progress(bot, conn, list(broadcasts))
+                finally:
+                    await release_connection(conn)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ outbox worker error: {e}")
+            await asyncio.sleep(5)
+            continue
+
+        if rows:
+            continue
+
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=OUTBOX_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,75 @@
+import os
+import time
+
+from aiogram import BaseMiddleware
+
+from database import get_connection, release_connection
+
+# скільки секунд довіряти локальній копії профілю (роль можуть змінити в базі)
+PROFILE_CACHE_TTL = float(os.environ.get("PROFILE_CACHE_TTL", 60))
+PROFILE_CACHE_MAX_SIZE = 10_000
+
+
+class ProfileCache:
+    """
+    Read-through кеш профілів користувачів (display_name, role).
+    Незареєстрованих теж кешуємо (як None), щоб не питати базу щоразу.
+    """
+
+    def __init__(self):
+        # user_id -> (cached_at, profile | None)
+        self._cache = {}
+
+    async def _fetch(self, user_id):
+        conn = await get_connection()
+        try:
+            row = await conn.fetchrow(
+                "SELECT user_id, display_name, role FROM users WHERE user_id = $1",
+                user_id
+            )
+        finally:
+            await release_connection(conn)
+        return dict(row) if row else None
+
+    def _remember(self, user_id, profile):
+        if len(self._cache) >= PROFILE_CACHE_MAX_SIZE:
+            border = time.monotonic() - PROFILE_CACHE_TTL
+            for k in [k for k, v in self._cache.items() if v[0] < border]:
+                del self._cache[k]
+            if len(self._cache) >= PROFILE_CACHE_MAX_SIZE:
+                self._cache.clear()
+        self._cache[user_id] = (time.monotonic(), profile)
+
+    async def get(self, user_id):
+        """{user_id, display_name, role} або None, якщо користувача немає"""
+        cached = self._cache.get(user_id)
+        if cached and time.monotonic() - cached[0] < PROFILE_CACHE_TTL:
+            return cached[1]
+
+        profile = await self._fetch(user_id)
+        self._remember(user_id, profile)
+        return profile
+
+    def invalidate(self, user_id):
+        """Прибирає профіль з кешу (після зміни ніку, ролі, реєстрації)"""
+        self._cache.pop(user_id, None)
+
+    def clear(self):
+        self._cache.clear()
+
+
+profiles = ProfileCache()
+
+
+class ProfileMiddleware(BaseMiddleware):
+    """
+    Передає в хендлер аргумент profile (див. ProfileCache.get).
+    Профіль береться лише для хендлерів, які мають параметр profile.
+    """
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        user = data.get("event_from_user")
+        if user is not None and handler_object is not None and "profile" in handler_object.params:
+            data["profile"] = await profiles.get(user.id)
+        return await handler(event, data)
@@ -0,0 +1,260 @@
+import asyncio
+import heapq
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from database import get_connection, release_connection
+from notify import SCHEDULED_JOBS_CHANGED
+
+KYIV_TZ = pytz.timezone("Europe/Kyiv")
+# через скільки повторити job, що впав з помилкою
+RETRY_DELAY = timedelta(minutes=1)
+# jobs, створені на інших репліках, лідер підхоплює не пізніше ніж через стільки секунд
+SCHEDULER_RESYNC_INTERVAL = float(os.environ.get("SCHEDULER_RESYNC_INTERVAL", 300))
+# пауза між спробами перечитати jobs, якщо база недоступна (сек): 5, 10, 20 ... до 60
+LOAD_RETRY_DELAY = 5
+LOAD_RETRY_MAX_DELAY = 60
+
+
+def _load_retry_delay(attempt):
+    return min(LOAD_RETRY_DELAY * 2 ** attempt, LOAD_RETRY_MAX_DELAY)
+
+
+def kyiv_time(day, hour, minute=0):
+    """Абсолютний момент часу hour:minute за Києвом у день day"""
+    return KYIV_TZ.localize(datetime(day.year, day.month, day.day, hour, minute))
+
+
+class Scheduler:
+    """
+    Планувальник з пріоритетною чергою за абсолютним часом спрацювання.
+    Jobs зберігаються в scheduled_jobs, тож пропущені під час рестарту
+    виконуються одразу після старту. Спить рівно до найближчого job.
+    Працює лише на лідері (run); schedule()/cancel() з будь-якої репліки лише пишуть
+    у таблицю і шлють SCHEDULED_JOBS_CHANGED — лідер перечитує цей job (job_changed).
+    """
+
+    def __init__(self):
+        self._handlers = {}
+        # job_key -> (fire_at, kind, payload)
+        self._jobs = {}
+        # (timestamp, job_key); застарілі записи просто пропускаємо
+        self._heap = []
+        self._wakeup = asyncio.Event()
+        self._loaded_at = 0.0
+        # True лише поки працює run() (на лідері); інакше локальна черга не ведеться
+        self._running = False
+
+    def handler(self, kind):
+        """Декоратор: async def f(payload) виконує jobs цього типу"""
+        def decorator(func):
+            self._handlers[kind] = func
+            return func
+        return decorator
+
+    def _push(self, job_key, fire_at, kind, payload):
+        self._jobs[job_key] = (fire_at, kind, payload)
+        heapq.heappush(self._heap, (fire_at.timestamp(), job_key))
+        self._wakeup.set()
+
+    async def _write(self, conn, sql, job_key, *args):
+        """
+        Зміна job + pg_notify в одній транзакції: повідомлення дійде до лідера
+        лише після коміту (conn — транзакція того, хто викликає)
+        """
+        own_conn = conn is None
+        if own_conn:
+            conn = await get_connection()
+        try:
+            async with conn.transaction():
+                await conn.execute(sql, job_key, *args)
+                await conn.execute("SELECT pg_notify($1, $2)", SCHEDULED_JOBS_CHANGED, job_key)
+        finally:
+            if own_conn:
+                await release_connection(conn)
+        return own_conn
+
+    async def schedule(self, job_key, kind, fire_at, payload=None, conn=None):
+        """Створює або переносить job. conn — щоб записати в одній транзакції"""
+        payload = payload or {}
+        committed = await self._write(
+            conn,
+            """
+            INSERT INTO scheduled_jobs (job_key, kind, payload, fire_at)
+            VALUES ($1, $2, $3::jsonb, $4)
+            ON CONFLICT (job_key) DO UPDATE
+            SET kind = EXCLUDED.kind,
+                payload = EXCLUDED.payload,
+                fire_at = EXCLUDED.fire_at
+            """,
+            job_key, kind, json.dumps(payload), fire_at
+        )
+        # на лідері вже закомічене ставимо в чергу одразу, не чекаючи повідомлення
+        if committed and self._running:
+            self._push(job_key, fire_at, kind, payload)
+
+    async def cancel(self, job_key, conn=None):
+        committed = await self._write(conn, "DELETE FROM scheduled_jobs WHERE job_key = $1", job_key)
+        if committed and self._running and self._jobs.pop(job_key, None):
+            self._wakeup.set()
+
+    async def _reload_job(self, job_key):
+        conn = await get_connection()
+        try:
+            row = await conn.fetchrow(
+                "SELECT kind, payload, fire_at FROM scheduled_jobs WHERE job_key = $1",
+                job_key
+            )
+        finally:
+            await release_connection(conn)
+
+        if not self._running:
+            return
+        if row:
+            self._push(job_key, row["fire_at"], row["kind"], json.loads(row["payload"]))
+        elif self._jobs.pop(job_key, None):
+            self._wakeup.set()
+
+    def job_changed(self, job_key):
+        """SCHEDULED_JOBS_CHANGED: лідер перечитує змінений job, інші репліки ігнорують"""
+        if not self._running:
+            return
+
+        async def reload():
+            try:
+                await self._reload_job(job_key)
+            except Exception as e:
+                # підхопимо на найближчому resync
+                print(f"⚠️ scheduler reload of {job_key} failed: {e}")
+
+        asyncio.create_task(reload())
+
+    def resync(self):
+        """Повідомлення могли загубитись (перепідключення слухача) — перечитати всі jobs"""
+        if self._running:
+            self._loaded_at = 0.0
+            self._wakeup.set()
+
+    async def load(self):
+        """Підтягує всі jobs з бази (при старті та раз на SCHEDULER_RESYNC_INTERVAL)"""
+        conn = await get_connection()
+        try:
+            rows = await conn.fetch("SELECT job_key, kind, payload, fire_at FROM scheduled_jobs")
+        finally:
+            await release_connection(conn)
+
+        first_load = self._loaded_at == 0.0
+        self._loaded_at = time.monotonic()
+        self._jobs.clear()
+        self._heap.clear()
+        for r in rows:
+            self._push(r["job_key"], r["fire_at"], r["kind"], json.loads(r["payload"]))
+        if first_load:
+            print(f"🗓 scheduler loaded jobs: {len(rows)}")
+
+    async def _try_load(self, attempt):
+        """load() без падіння: True або False (помилку вже залоговано)"""
+        try:
+            await self.load()
+            return True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            delay = _load_retry_delay(attempt)
+            print(f"⚠️ scheduler load failed: {e}; retry in {delay:.0f}s")
+            return False
+
+    async def _run_job(self, job_key, fire_at, kind, payload):
+        handler = self._handlers.get(kind)
+        if handler is None:
+            print(f"⚠️ no handler for job {job_key} ({kind})")
+            self._jobs.pop(job_key, None)
+            return
+
+        try:
+            await handler(payload)
+        except Exception as e:
+            print(f"⚠️ job {job_key} failed: {e}")
+            await self.schedule(job_key, kind, datetime.now(pytz.utc) + RETRY_DELAY, payload)
+            return
+
+        # job могли перенести, поки він виконувався — тоді не видаляємо
+        conn = await get_connection()
+        try:
+            await conn.execute(
+                "DELETE FROM scheduled_jobs WHERE job_key = $1 AND fire_at = $2",
+                job_key, fire_at
+            )
+        finally:
+            await release_connection(conn)
+        if self._jobs.get(job_key, (None,))[0] == fire_at:
+            del self._jobs[job_key]
+
+    async def run(self):
+        self._running = True
+        try:
+            await self._run()
+        finally:
+            # лідерство втрачено: черга більше не наша
+            self._running = False
+            self._jobs.clear()
+            self._heap.clear()
+            self._loaded_at = 0.0
+
+    async def _run(self):
+        # без першого завантаження не знаємо жодного job — чекаємо базу
+        attempt = 0
+        while not await self._try_load(attempt):
+            await asyncio.sleep(_load_retry_delay(attempt))
+            attempt += 1
+
+        attempt = 0
+        while True:
+            self._wakeup.clear()
+
+            until_resync = self._loaded_at + SCHEDULER_RESYNC_INTERVAL - time.monotonic()
+            if until_resync <= 0:
+                if await self._try_load(attempt):
+                    attempt = 0
+                else:
+                    # відомі jobs виконуємо далі, наступна спроба — після паузи
+                    delay = _load_retry_delay(attempt)
+                    self._loaded_at = time.monotonic() + delay - SCHEDULER_RESYNC_INTERVAL
+                    attempt += 1
+                continue
+
+            # прибираємо застарілі записи купи (скасовані / перенесені jobs)
+            while self._heap:
+                ts, job_key = self._heap[0]
+                job = self._jobs.get(job_key)
+                if job and job[0].timestamp() == ts:
+                    break
+                heapq.heappop(self._heap)
+
+            if self._heap:
+                ts, job_key = self._heap[0]
+                delay = ts - datetime.now(pytz.utc).timestamp()
+            else:
+                delay = until_resync
+
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, until_resync))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            fire_at, kind, payload = self._jobs[job_key]
+            try:
+                await self._run_job(job_key, fire_at, kind, payload)
+            except Exception as e:
+                print(f"⚠️ scheduler error: {e}")
+                await asyncio.sleep(5)
+
+
+scheduler = Scheduler()
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# модулі бота імпортуються як top-level (див. Dockerfile: python mafia_bot/bot.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+
+# окрема тестова база: схему public тести повністю перестворюють
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+
+async def _reset_schema():
+    conn = await database.get_connection()
+    try:
+        await conn.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public")
+    finally:
+        await database.release_connection(conn)
+    await database.init_db()
+
+
+@pytest.fixture
+def pg(monkeypatch):
+    """
+    run(test) — виконує async def test() на чистій схемі з усіма міграціями.
+    Без TEST_DATABASE_URL тест пропускається.
+    """
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    monkeypatch.setattr(database, "DATABASE_URL", TEST_DATABASE_URL)
+
+    def run(test):
+        async def main():
+            try:
+                await _reset_schema()
+                return await test()
+            finally:
+                await database.close_pool()
+        return asyncio.run(main())
+
+    return run
+
+
+async def fetch(sql, *args):
+    conn = await database.get_connection()
+    try:
+        return await conn.fetch(sql, *args)
+    finally:
+        await database.release_connection(conn)
+
+
+async def execute(sql, *args):
+    conn = await database.get_connection()
+    try:
+        return await conn.execute(sql, *args)
+    finally:
+        await database.release_connection(conn)
@@ -0,0 +1,85 @@
+from modules.underground import exporter, ledger, sheets
+from conftest import execute, fetch
+
+
+class FakeSheets:
+    """Записує, що експортер відправив у таблицю; before_write — «паралельна» зміна в базі"""
+
+    def __init__(self, monkeypatch, before_write=None, skip_players=()):
+        self.players = []
+        self.results = []
+        self.events = []
+        self.before_write = before_write
+        self.skip_players = set(skip_players)
+
+        monkeypatch.setattr(sheets, "export_players", self._export_players)
+        monkeypatch.setattr(sheets, "export_results", self.results.extend)
+        monkeypatch.setattr(sheets, "export_events", self.events.extend)
+        monkeypatch.setattr(sheets.write_queue, "flush", lambda: {})
+        monkeypatch.setattr(exporter, "run_sheets", self._run_sheets)
+
+    def _export_players(self, players):
+        self.players.extend(players)
+        return {p["player_id"] for p in players} & self.skip_players
+
+    async def _run_sheets(self, func, *args, timeout=None, **kwargs):
+        if self.before_write:
+            before_write, self.before_write = self.before_write, None
+            await before_write()
+        return func(*args, **kwargs)
+
+
+async def _unexported_players():
+    rows = await fetch("SELECT player_id FROM players WHERE exported_at IS DISTINCT FROM updated_at")
+    return [r["player_id"] for r in rows]
+
+
+def test_export_marks_rows_and_skips_them_next_time(pg, monkeypatch):
+    fake = FakeSheets(monkeypatch)
+
+    async def test():
+        await ledger.accrue(1, "Гра", 100, "Nick", "🥇 Топ 1")
+
+        assert await exporter.export_once() == 3
+        assert [p["balance"] for p in fake.players] == [150]
+        assert len(fake.results) == 1 and len(fake.events) == 1
+
+        assert await exporter.export_once() == 0
+        assert await _unexported_players() == []
+        assert (await fetch("SELECT bool_and(exported) AS done FROM results"))[0]["done"]
+
+    pg(test)
+
+
+def test_change_during_export_is_exported_again(pg, monkeypatch):
+    async def accrue_meanwhile():
+        await ledger.accrue(1, "Гра", 100, "Nick", "🔥 MVP")
+
+    fake = FakeSheets(monkeypatch, before_write=accrue_meanwhile)
+
+    async def test():
+        await ledger.accrue(1, "Гра", 100, "Nick", "🥇 Топ 1")
+
+        await exporter.export_once()
+        # у таблицю пішла версія до MVP — позначена лише вона
+        assert [p["balance"] for p in fake.players] == [150]
+        assert await _unexported_players() == [100]
+
+        await exporter.export_once()
+        assert [p["balance"] for p in fake.players] == [150, 250]
+        assert await _unexported_players() == []
+
+    pg(test)
+
+
+def test_player_not_written_stays_unexported(pg, monkeypatch):
+    FakeSheets(monkeypatch, skip_players=[100])
+
+    async def test():
+        await execute("INSERT INTO players (player_id, nick) VALUES (100, 'A'), (200, 'B')")
+
+        await exporter.export_once()
+
+        assert await _unexported_players() == [100]
+
+    pg(test)
@@ -0,0 +1,80 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from modules.underground import ledger
+from conftest import execute, fetch
+
+
+async def _player(player_id):
+    rows = await fetch("SELECT balance, current_streak, total_games FROM players WHERE player_id = $1", player_id)
+    return dict(rows[0])
+
+
+async def _results(player_id):
+    return await fetch("SELECT event_id, place, income FROM results WHERE player_id = $1", player_id)
+
+
+def test_accrue_same_bonus_twice_counts_once(pg):
+    async def test():
+        first, second = await asyncio.gather(
+            ledger.accrue(1, "Гра", 100, "Nick", "🥇 Топ 1"),
+            ledger.accrue(1, "Гра", 100, "Nick", "🥇 Топ 1"),
+        )
+
+        assert sorted([first is None, second is None]) == [False, True]
+        assert await _player(100) == {"balance": 150, "current_streak": 1, "total_games": 1}
+        assert len(await _results(100)) == 1
+
+    pg(test)
+
+
+def test_accrue_dedup_without_process_lock(pg, monkeypatch):
+    # дві репліки: локальний lock не допомагає, лишаються FOR UPDATE і унікальний ключ
+    @asynccontextmanager
+    async def no_lock(player_id):
+        yield
+
+    monkeypatch.setattr(ledger, "_player_lock", no_lock)
+
+    async def test():
+        accruals = await asyncio.gather(*(
+            ledger.accrue(1, "Гра", 100, "Nick", "🔥 MVP") for _ in range(5)
+        ))
+
+        assert sum(a is not None for a in accruals) == 1
+        assert await _player(100) == {"balance": 100, "current_streak": 1, "total_games": 1}
+
+    pg(test)
+
+
+def test_accrue_different_bonuses_all_apply(pg, monkeypatch):
+    @asynccontextmanager
+    async def no_lock(player_id):
+        yield
+
+    monkeypatch.setattr(ledger, "_player_lock", no_lock)
+
+    async def test():
+        await asyncio.gather(
+            ledger.accrue(1, "Гра", 100, "Nick", "🥇 Топ 1"),
+            ledger.accrue(1, "Гра", 100, "Nick", "🔥 MVP"),
+            ledger.accrue(1, "Гра", 100, "Nick", "👮 Шериф"),
+        )
+
+        assert await _player(100) == {"balance": 300, "current_streak": 3, "total_games": 3}
+        assert sorted(r["income"] for r in await _results(100)) == [50, 100, 150]
+
+    pg(test)
+
+
+def test_accrue_respects_balance_limit(pg):
+    async def test():
+        await execute("INSERT INTO players (player_id, nick, balance) VALUES (100, 'Nick', 2450)")
+
+        accrual = await ledger.accrue(1, "Гра", 100, "Nick", "🥇 Топ 1")
+
+        assert accrual["income"] == 50
+        assert accrual["balance"] == 2500
+        assert [r["income"] for r in await _results(100)] == [50]
+
+    pg(test)
@@ -0,0 +1,146 @@
+import asyncio
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.methods import SendMessage
+
+import outbox
+from conftest import execute, fetch
+
+
+class FakeBot:
+    """send_message падає так, як задано в errors; решта запитів лише записуються"""
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.sent = []
+        self.edits = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        error = self.errors.get(chat_id)
+        if error:
+            raise error(method=SendMessage(chat_id=chat_id, text=text), message=error.__name__)
+        self.sent.append(chat_id)
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append(text)
+
+
+def _row(outbox_id, chat_id, broadcast_id=1):
+    return {"outbox_id": outbox_id, "broadcast_id": broadcast_id, "chat_id": chat_id}
+
+
+def _broadcast(broadcast_id=1):
+    return {broadcast_id: {"text": "hi", "parse_mode": None, "reply_markup": None}}
+
+
+# ================== CLASSIFICATION ==================
+def test_deliver_batch_classifies_results():
+    bot = FakeBot({
+        2: TelegramForbiddenError,
+        3: TelegramBadRequest,
+    })
+    rows = [_row(10, 1), _row(20, 2), _row(30, 3)]
+
+    sent, failed, errors, permanent, unreachable = asyncio.run(
+        outbox._deliver_batch(bot, rows, _broadcast())
+    )
+
+    assert sent == [10]
+    assert dict(zip(failed, permanent)) == {20: True, 30: False}
+    assert len(errors) == 2
+    assert unreachable == [2]
+
+
+# ================== CLAIM / RECORD ==================
+async def _enqueue(chat_ids, **kwargs):
+    await execute(
+        """
+        INSERT INTO users (user_id, role)
+        SELECT unnest($1::bigint[]), 'player'
+        ON CONFLICT DO NOTHING
+        """,
+        chat_ids
+    )
+    return await outbox.enqueue_broadcast(chat_ids, "hi", **kwargs)
+
+
+def test_claim_skips_claimed_rows_and_reclaims_stale(pg):
+    async def test():
+        await _enqueue([1, 2, 3])
+
+        conn_a = await outbox.get_connection()
+        conn_b = await outbox.get_connection()
+        try:
+            first = await outbox._claim_batch(conn_a)
+            assert sorted(r["chat_id"] for r in first) == [1, 2, 3]
+            # усе вже в роботі — друга репліка нічого не отримує
+            assert await outbox._claim_batch(conn_b) == []
+
+            # воркер "помер": його порція старша за OUTBOX_LOCK_TIMEOUT
+            await conn_a.execute(
+                "UPDATE outbox SET locked_at = now() - make_interval(secs => $1) WHERE chat_id = 2",
+                outbox.OUTBOX_LOCK_TIMEOUT + 1
+            )
+            again = await outbox._claim_batch(conn_b)
+            assert [r["chat_id"] for r in again] == [2]
+        finally:
+            await outbox.release_connection(conn_a)
+            await outbox.release_connection(conn_b)
+
+    pg(test)
+
+
+def test_record_results_retries_fails_and_deactivates(pg):
+    async def test():
+        await _enqueue([1, 2, 3, 4])
+        conn = await outbox.get_connection()
+        try:
+            rows = {r["chat_id"]: r["outbox_id"] for r in await outbox._claim_batch(conn)}
+            # у 4-го це остання спроба
+            await conn.execute(
+                "UPDATE outbox SET attempts = $1 - 1 WHERE outbox_id = $2",
+                outbox.OUTBOX_MAX_ATTEMPTS, rows[4]
+            )
+            await outbox._record_results(
+                conn,
+                [rows[1]],
+                [rows[2], rows[3], rows[4]],
+                ["timeout", "blocked", "timeout"],
+                [False, True, False],
+                [3],
+            )
+        finally:
+            await outbox.release_connection(conn)
+
+        status = {r["chat_id"]: r["status"] for r in await fetch("SELECT chat_id, status FROM outbox")}
+        assert status == {1: "sent", 2: "pending", 3: "failed", 4: "failed"}
+
+        active = {r["user_id"]: r["is_active"] for r in await fetch("SELECT user_id, is_active FROM users")}
+        assert active == {1: 1, 2: 1, 3: 0, 4: 1}
+
+    pg(test)
+
+
+def test_broadcast_finishes_exactly_once(pg):
+    async def test():
+        broadcast_id = await _enqueue([1, 2], report_chat_id=99, report_message_id=5, done_text="✅ {sent}/{failed}")
+        bot = FakeBot()
+        conn_a = await outbox.get_connection()
+        conn_b = await outbox.get_connection()
+        try:
+            rows = await outbox._claim_batch(conn_a)
+            await outbox._record_results(conn_a, [r["outbox_id"] for r in rows], [], [], [], [])
+            # дві репліки бачать завершену розсилку одночасно
+            await asyncio.gather(
+                outbox._report_progress(bot, conn_a, [broadcast_id]),
+                outbox._report_progress(bot, conn_b, [broadcast_id]),
+            )
+        finally:
+            await outbox.release_connection(conn_a)
+            await outbox.release_connection(conn_b)
+
+        assert bot.edits == ["✅ 2/0"]
+        finished = await fetch("SELECT finished_at FROM broadcasts WHERE broadcast_id = $1", broadcast_id)
+        assert finished[0]["finished_at"] is not None
+
+    pg(test)